@@ -14,6 +14,7 @@ from modules.utils.logging_setup import get_logger
 from modules.utils.paths import ITEM_IDS_FILE, PROJECT_ROOT, PRICE_CHECKER
 from modules.market.graph_generator import match_item_name, generate_graph, generate_combined_graph
 from modules.market.market_summary_generator import create_summary
+from modules.utils.db_pool import query_timings
 
 
 log = get_logger("MarketHandBot")
@@ -49,6 +50,7 @@ async def shutdown(interaction: discord.Interaction):
     
     if interaction.user.id == 305861137440833536:  # skyecat__
         log.critical("SHUTDOWN COMMAND GIVEN")
+        log.info(f"Read query timings: {query_timings.summary()}")
         await interaction.response.send_message("Shutting down...", ephemeral=True)
         await bot.change_presence(status=discord.Status.offline)  # Set offline before closing
         await bot.close()
@@ -5,9 +5,11 @@ from dotenv import load_dotenv
 from requests_oauthlib import OAuth2Session
 import asyncio
 import sys
+import time as t
 from modules.utils.paths import ESI_DIR, TOKEN_FILE
 from modules.utils.logging_setup import get_logger
 from modules.utils.token_gen import CLIENT_ID, TOKEN_URL
+from modules.esi.esi_client import get_esi_client, close_esi_client
 
 log = get_logger("ATManager")
 
@@ -15,6 +17,8 @@ load_dotenv()
 CLIENT_ID = os.getenv("ESI_CLIENT_ID")
 CLIENT_SECRET = os.getenv("ESI_CLIENT_SECRET")
 TOKEN_URL = "https://login.eveonline.com/v2/oauth/token"
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", 300))
+TOKEN_RETRY_SECONDS = int(os.getenv("TOKEN_RETRY_SECONDS", 30))
 
 async def read_token():
     try:
@@ -59,8 +63,11 @@ async def async_save_token(new_token):
         log.debug("Saving Token")
         log.debug(f"Opening token_path for write: {TOKEN_FILE}")
         log.debug(f"token_path dirname exists: {os.path.isdir(os.path.dirname(TOKEN_FILE))}")
-        with open(TOKEN_FILE, 'w') as token_file:
-            json.dump(new_token, token_file, indent=2)
+        # Writing to a temp file first so a reader never sees a half-written token
+        tmp_path = TOKEN_FILE.with_suffix(".tmp")
+        async with aiofiles.open(tmp_path, 'w') as token_file:
+            await token_file.write(json.dumps(new_token, indent=2))
+        os.replace(tmp_path, TOKEN_FILE)
         log.debug("Token Saved")
     except FileNotFoundError:
         log.critical("Token file does not exist!")
@@ -101,11 +108,80 @@ async def establish_esi_session():
     return esi, token
 
 
+async def refresh_if_expired(esi):
+    # The status check used to go through the OAuth2Session, which refreshed an expired
+    # token as a side effect. It now uses the async client, so the refresh is done here
+    # (in a worker thread, as requests_oauthlib is blocking).
+    expires_at = esi.token.get("expires_at")
+    if not expires_at or expires_at > t.time():
+        return esi.token
+    log.debug("Access token expired, refreshing")
+    token = await asyncio.to_thread(esi.refresh_token, TOKEN_URL)
+    await async_save_token(token)
+    return token
+
+
+class TokenManager:
+    """Holds the current ESI token and refreshes it in the background ahead of expiry.
+
+    Fetchers read it like the token dict (token["access_token"]), so each request picks
+    up whatever token is current at the time it is sent."""
+
+    def __init__(self, margin=TOKEN_REFRESH_MARGIN):
+        self.margin = margin
+        self.token = None
+        self._esi = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def __getitem__(self, key):
+        return self.token[key]
+
+    @property
+    def expires_at(self):
+        return self.token.get("expires_at", 0)
+
+    async def start(self):
+        self._esi, self.token = await establish_esi_session()
+        if self.expires_at - self.margin <= t.time():
+            await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+        log.debug(f"Token manager started, token expires in {self.expires_at - t.time():.0f}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh(self, stale_access_token=None):
+        # Callers that saw a 401 pass the token that failed; if someone already refreshed it, nothing to do
+        async with self._lock:
+            if stale_access_token is not None and self.token["access_token"] != stale_access_token:
+                return self.token
+            log.debug("Refreshing ESI access token")
+            token = await asyncio.to_thread(self._esi.refresh_token, TOKEN_URL)
+            await async_save_token(token)
+            self.token = token
+            log.info(f"ESI access token refreshed, valid for {self.expires_at - t.time():.0f}s")
+            return token
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(max(self.expires_at - self.margin - t.time(), 0))
+            try:
+                await self.refresh()
+            except Exception as e:
+                log.error(f"Background token refresh failed, retrying in {TOKEN_RETRY_SECONDS}s: {e}")
+                await asyncio.sleep(TOKEN_RETRY_SECONDS)
+
+
 async def test_esi_status():
 
     log.debug("Calling ESI Establishment")
 
     esi, token = await establish_esi_session()
+    token = await refresh_if_expired(esi)
 
     log.debug("ESI Established")
 
@@ -114,9 +190,9 @@ async def test_esi_status():
     while status_check_attempts < 5:
         try:
             status_check_attempts +=1
-            test_response = esi.get("https://esi.evetech.net/latest/status/", timeout=10)
-            log.debug(f"ESI Status check returned: {test_response}")
-            if test_response.status_code == 200:
+            test_response = await get_esi_client().get("https://esi.evetech.net/latest/status/")
+            log.debug(f"ESI Status check returned: {test_response.status}")
+            if test_response.status == 200:
                 log.info("ESI Status: ONLINE")
                 ESI_online = True
                 break
@@ -135,6 +211,7 @@ async def test_esi_status():
 
 async def main():
     ESI_online, token = await test_esi_status()
+    await close_esi_client()
 
     log.debug(f"Recived ESI Online Status as: {ESI_online}")
     log.debug(f"Recived Token as: {token}")
@@ -1,70 +1,442 @@
 import aiosqlite
+import os
+import time as t
+from datetime import datetime, UTC
+from collections import defaultdict
 import pandas as pd
+from dotenv import load_dotenv
 from modules.utils.logging_setup import get_logger
 from modules.utils.paths import ITEM_IDS_VOLUME_FILE
 from modules.utils.ore_controller import load_reprocess_ids
+from modules.utils.db_partitions import partition_paths
+from modules.utils.db_pool import get_pool, range_pool
+from modules.utils.order_archive import archived_min_sell, archived_sell_orders, archived_lowest_price_per_day, archived_rollups
 
 log = get_logger("DataControl")
 
-async def save_orders(database_path, orders, fetched_time):
-    rows_to_insert = []
-    for order in orders:
+load_dotenv()
+# "snapshot" writes every order every cycle, "changes" only new, changed and closed orders
+ORDER_STORAGE_MODE = os.getenv("ORDER_STORAGE_MODE", "snapshot")
 
-        rows_to_insert.append((
-            fetched_time,
-            order["type_id"],
-            order["volume_remain"],
-            order["price"],
-            order["is_buy_order"]
-        ))
+def epoch_seconds(value):
+    # Every timestamp column holds integer Unix seconds, so time windows are plain integer ranges
+    return value if isinstance(value, int) else int(value.timestamp())
 
-    async with aiosqlite.connect(database_path) as db:
-        await db.executemany("""
-            INSERT INTO market_orders (timestamp, type_id, volume_remain, price, is_buy_order)
-            VALUES (?, ?, ?, ?, ?)
-        """, rows_to_insert)
-        await db.commit()
-        await db.close()
+def window_start(days):
+    return int(t.time() - days * 86400)
 
-async def pull_recent_data(type_id, market_db):
+# === Read queries ===
+# Kept at module level so schema_migrations.check_query_plans can EXPLAIN the exact SQL
+# the read paths run. Sell-side filters are written "is_buy_order = 0" to match the
+# partial indexes' WHERE clause term for term, which is what lets sqlite use them.
+RECENT_DATA_QUERY = """
+    SELECT timestamp, type_id, volume_remain, price, is_buy_order
+    FROM (
+        SELECT *,
+            ROW_NUMBER() OVER (
+                PARTITION BY type_id 
+                ORDER BY timestamp DESC, price ASC
+            ) AS rn
+        FROM market_orders
+        WHERE type_id = ?
+        AND is_buy_order = 0
+    )
+    WHERE rn = 1
+"""
+
+DAYS_QUERY = """
+    SELECT 
+        timestamp,
+        price,
+        volume_remain,
+        is_buy_order
+    FROM market_orders
+    WHERE type_id = ?
+        AND is_buy_order = 0
+        AND timestamp >= ?
+    ORDER BY timestamp DESC, price DESC
+"""
+
+LOWEST_PRICE_PER_DAY_QUERY = """
+    SELECT 
+        DATE(bucket, 'unixepoch') as order_date,
+        low as lowest_price
+    FROM type_rollups_daily
+    WHERE type_id = ?
+        AND bucket >= ?
+    ORDER BY bucket DESC
+"""
+
+# Each snapshot's lowest sell, which type_snapshots already holds: the graphs read one row
+# per timestamp instead of every sell order and grouping them in Python
+MIN_SELL_BY_TIME_QUERY = """
+    SELECT timestamp, min_sell AS price
+    FROM type_snapshots
+    WHERE type_id = ?
+      AND min_sell IS NOT NULL
+      AND timestamp >= ?
+    ORDER BY timestamp ASC
+"""
 
-    async with aiosqlite.connect(market_db) as db:
-        db.row_factory = aiosqlite.Row
+# Latest snapshot's best sell, in the market_orders row shape callers index into
+LATEST_PRICE_QUERY = """
+    SELECT timestamp, type_id, sell_volume AS volume_remain, min_sell AS price, 0 AS is_buy_order
+    FROM type_snapshots
+    WHERE type_id = ?
+      AND min_sell IS NOT NULL
+    ORDER BY timestamp DESC
+    LIMIT 1
+"""
 
-        query = """
-            SELECT timestamp, type_id, volume_remain, price, is_buy_order
+# Changes-only storage keeps no market_orders rows but the ore values, so the order-level
+# reads replay a type's order_changes instead (see replay_sell_orders)
+ORDER_CHANGES_BY_TYPE_QUERY = """
+    SELECT timestamp, order_id, volume_remain, price, change
+    FROM order_changes
+    WHERE type_id = ?
+      AND is_buy_order = 0
+      AND timestamp <= ?
+    ORDER BY timestamp
+"""
+
+SNAPSHOT_TIMES_QUERY = """
+    SELECT timestamp
+    FROM order_snapshots
+    WHERE timestamp >= ?
+      AND timestamp <= ?
+    ORDER BY timestamp
+"""
+
+# === Price rollups ===
+# Per type and hour / day: the low, high, close and average of each snapshot's best sell,
+# plus the average sell volume. Long windows read these instead of every snapshot, picking
+# the coarsest resolution that still gives a chart CHART_TARGET_POINTS points, so a read
+# costs about the same whatever the window.
+ROLLUP_TABLES = {86400: "type_rollups_daily", 3600: "type_rollups_hourly"}
+CHART_TARGET_POINTS = int(os.getenv("CHART_TARGET_POINTS", 200))
+
+ROLLUP_QUERIES = {
+    seconds: f"""
+        SELECT
+            bucket AS timestamp,
+            type_id,
+            low,
+            high,
+            close,
+            price_sum / samples AS average,
+            volume_sum / samples AS volume
+        FROM {table}
+        WHERE type_id = ?
+        AND bucket >= ?
+        ORDER BY bucket DESC
+    """
+    for seconds, table in ROLLUP_TABLES.items()
+}
+
+def rollup_resolution(days):
+    # Seconds per point of the coarsest rollup that still fills the chart, None for every snapshot
+    for seconds in ROLLUP_TABLES:
+        if days * 86400 / seconds >= CHART_TARGET_POINTS:
+            return seconds
+    return None
+
+async def query_rollups(type_id, market_db, start, seconds):
+    # Newest first; the first bucket is the one the window starts in
+    params = (type_id, start - start % seconds)
+    return await range_pool(market_db, start=start).fetchall(f"query_rollups_{seconds}", ROLLUP_QUERIES[seconds], params)
+
+async def update_rollups(db, summary, fetched_time):
+    # Folds one snapshot's summary into its hour and day. close_timestamp makes this safe to
+    # repeat: a snapshot already folded into a bucket (a replay) is not counted twice.
+    fetched_time = epoch_seconds(fetched_time)
+    for seconds, table in ROLLUP_TABLES.items():
+        await db.executemany(f"""
+            INSERT INTO {table} (type_id, bucket, low, high, close, close_timestamp, price_sum, volume_sum, samples)
+            VALUES (?1, ?2, ?3, ?3, ?3, ?5, ?3, ?4, 1)
+            ON CONFLICT(type_id, bucket) DO UPDATE SET
+                low = MIN(low, excluded.low),
+                high = MAX(high, excluded.high),
+                close = excluded.close,
+                close_timestamp = excluded.close_timestamp,
+                price_sum = price_sum + excluded.price_sum,
+                volume_sum = volume_sum + excluded.volume_sum,
+                samples = samples + 1
+            WHERE excluded.close_timestamp > close_timestamp
+        """, summary.rollup_rows(fetched_time, seconds))
+
+async def rebuild_rollups(db):
+    # Recomputes every rollup from type_snapshots (schema migration 6, and after backfills)
+    for seconds, table in ROLLUP_TABLES.items():
+        await db.execute(f"""
+            INSERT OR REPLACE INTO {table} (type_id, bucket, low, high, close, close_timestamp, price_sum, volume_sum, samples)
+            SELECT buckets.type_id, bucket, low, high, closing.min_sell, close_timestamp, price_sum, volume_sum, samples
             FROM (
-                SELECT *,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY type_id 
-                        ORDER BY timestamp DESC, price ASC
-                    ) AS rn
-                FROM market_orders
-                WHERE type_id = ?
-                AND is_buy_order = FALSE
-            )
-            WHERE rn = 1
-        """
-    
-        params = [type_id]
-
-        async with db.execute(query, tuple(params)) as cursor:
-            rows = await cursor.fetchall()
-            log.debug(f"Returning recent data for type id {type_id}: {rows}")
-            return rows
+                SELECT
+                    type_id,
+                    timestamp - timestamp % {seconds} AS bucket,
+                    MIN(min_sell) AS low,
+                    MAX(min_sell) AS high,
+                    MAX(timestamp) AS close_timestamp,
+                    SUM(min_sell) AS price_sum,
+                    SUM(sell_volume) AS volume_sum,
+                    COUNT(*) AS samples
+                FROM type_snapshots
+                WHERE min_sell IS NOT NULL
+                GROUP BY type_id, bucket
+            ) AS buckets
+            JOIN type_snapshots AS closing
+                ON closing.type_id = buckets.type_id AND closing.timestamp = buckets.close_timestamp
+        """)
 
-async def save_ore_orders(database_path, ore_price, fetched_time, type_id):
-    rows_to_insert = []
+# === market_orders layouts ===
+# "heap" is the original rowid table, in insertion order. "clustered" is WITHOUT ROWID with
+# PRIMARY KEY (type_id, timestamp, order_id), so one item's history sits on a run of
+# neighbouring pages (see modules/utils/cluster_market_orders.py). Its order_id is the ESI
+# order id, 0 for an ore value row, and minus the old rowid for rows converted from a heap.
+# Rows are keyed, so writing the same snapshot twice (a replay) replaces rather than duplicates.
+
+async def market_orders_clustered(db):
+    async with db.execute("SELECT 1 FROM pragma_table_info('market_orders') WHERE name = 'order_id'") as cursor:
+        return await cursor.fetchone() is not None
+
+async def insert_orders(db, orders, fetched_time, clustered=False):
+    fetched_time = epoch_seconds(fetched_time)
+    if clustered:
+        await db.executemany("""
+            INSERT OR REPLACE INTO market_orders (timestamp, type_id, order_id, volume_remain, price, is_buy_order)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, orders.clustered_rows(fetched_time))
+        return
+    await db.executemany("""
+        INSERT INTO market_orders (timestamp, type_id, volume_remain, price, is_buy_order)
+        VALUES (?, ?, ?, ?, ?)
+    """, orders.order_rows(fetched_time))
+
+# === Changes-only storage ===
+# Each snapshot is staged into a temp table, diffed against open_orders, and only
+# the difference is written: new and changed orders, plus orders that disappeared.
+
+async def begin_order_diff(db):
+    await db.execute("DROP TABLE IF EXISTS temp.staged_orders")
+    await db.execute("""
+        CREATE TEMP TABLE staged_orders (
+            order_id INTEGER PRIMARY KEY,
+            type_id INTEGER NOT NULL,
+            volume_remain INTEGER NOT NULL,
+            price REAL NOT NULL,
+            is_buy_order BOOLEAN NOT NULL,
+            location_id INTEGER NOT NULL,
+            issued INTEGER NOT NULL,
+            duration INTEGER NOT NULL
+        )
+    """)
+
+async def stage_book_orders(db, orders):
+    await db.executemany("""
+        INSERT OR IGNORE INTO staged_orders (order_id, type_id, volume_remain, price, is_buy_order, location_id, issued, duration)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, orders.book_rows())
+
+async def apply_order_changes(db, fetched_time):
+    fetched_time = epoch_seconds(fetched_time)
+    await db.execute("DROP TABLE IF EXISTS temp.changed_orders")
+    await db.execute("""
+        CREATE TEMP TABLE changed_orders AS
+        SELECT s.*, CASE WHEN o.order_id IS NULL THEN 'new' ELSE 'changed' END AS change
+        FROM staged_orders s
+        LEFT JOIN open_orders o ON o.order_id = s.order_id
+        WHERE o.order_id IS NULL
+            OR o.price != s.price
+            OR o.volume_remain != s.volume_remain
+    """)
+
+    # Orders missing from this snapshot were filled, cancelled or expired; they keep their last known state
+    await db.execute("""
+        INSERT INTO changed_orders
+        SELECT o.*, 'closed'
+        FROM open_orders o
+        WHERE o.order_id NOT IN (SELECT order_id FROM staged_orders)
+    """)
+
+    await db.execute("""
+        INSERT INTO order_changes (timestamp, order_id, type_id, volume_remain, price, is_buy_order, change)
+        SELECT ?, order_id, type_id, volume_remain, price, is_buy_order, change
+        FROM changed_orders
+    """, (fetched_time,))
+
+    await db.execute("""
+        DELETE FROM open_orders
+        WHERE order_id IN (SELECT order_id FROM changed_orders WHERE change = 'closed')
+    """)
+    await db.execute("""
+        INSERT INTO open_orders (order_id, type_id, volume_remain, price, is_buy_order, location_id, issued, duration)
+        SELECT order_id, type_id, volume_remain, price, is_buy_order, location_id, issued, duration
+        FROM changed_orders
+        WHERE change != 'closed'
+        ON CONFLICT(order_id) DO UPDATE SET
+            volume_remain = excluded.volume_remain,
+            price = excluded.price,
+            issued = excluded.issued,
+            duration = excluded.duration
+    """)
+
+    async with db.execute("SELECT change, COUNT(*) FROM changed_orders GROUP BY change") as cursor:
+        counts = {"new": 0, "changed": 0, "closed": 0, **dict(await cursor.fetchall())}
+    async with db.execute("SELECT COUNT(*) FROM staged_orders") as cursor:
+        (order_count,) = await cursor.fetchone()
+
+    await db.execute("""
+        INSERT OR REPLACE INTO order_snapshots (timestamp, orders, changes)
+        VALUES (?, ?, ?)
+    """, (fetched_time, order_count, sum(counts.values())))
+
+    await db.execute("DROP TABLE temp.changed_orders")
+    await db.execute("DROP TABLE temp.staged_orders")
+    log.debug(f"Snapshot of {order_count} orders: {counts['new']} new, {counts['changed']} changed, {counts['closed']} closed")
+    return counts
+
+async def rebuild_snapshot(market_db, timestamp):
+    # The book at a snapshot is the latest change to each order at or before it, minus closed orders.
+    # Rows come back in market_orders shape. Only the file holding the snapshot is read: each
+    # file starts its own open_orders, so its changes alone describe the book.
+    query = """
+        SELECT ? AS timestamp, type_id, volume_remain, price, is_buy_order
+        FROM (
+            SELECT type_id, volume_remain, price, is_buy_order, change,
+                ROW_NUMBER() OVER (
+                    PARTITION BY order_id
+                    ORDER BY timestamp DESC
+                ) AS rn
+            FROM order_changes
+            WHERE timestamp <= ?
+        )
+        WHERE rn = 1
+        AND change != 'closed'
+    """
+
+    timestamp = epoch_seconds(timestamp)
+    rows = await range_pool(market_db, start=timestamp, end=timestamp).fetchall("rebuild_snapshot", query, (timestamp, timestamp))
+    log.debug(f"Rebuilt snapshot {timestamp} with {len(rows)} orders")
+    return rows
+
+async def replay_file(path, type_id, start, end):
+    # type_id's sell orders at each of the file's snapshots in [start, end], oldest first.
+    # A file's first snapshot logs every order as new, so its changes replay on their own.
+    pool = get_pool([path])
+    changes = await pool.fetchall("replay_order_changes", ORDER_CHANGES_BY_TYPE_QUERY, (type_id, end))
+    snapshots = await pool.fetchall("replay_snapshot_times", SNAPSHOT_TIMES_QUERY, (start, end))
+    book = {}
+    rows = []
+    position = 0
+    for (timestamp,) in snapshots:
+        while position < len(changes) and changes[position]["timestamp"] <= timestamp:
+            change = changes[position]
+            if change["change"] == "closed":
+                book.pop(change["order_id"], None)
+            else:
+                book[change["order_id"]] = (change["volume_remain"], change["price"])
+            position += 1
+        rows.extend({"timestamp": timestamp, "type_id": type_id, "volume_remain": volume_remain, "price": price, "is_buy_order": 0} for volume_remain, price in book.values())
+    return rows
+
+async def replay_sell_orders(type_id, market_db, start, end=None):
+    # What DAYS_QUERY would return over [start, end] had every order been stored, oldest first
+    end = int(t.time()) if end is None else end
+    rows = []
+    for path in reversed(partition_paths(market_db, start, end)):
+        rows.extend(await replay_file(path, type_id, start, end))
+    return rows
 
-    rows_to_insert.append((
-        fetched_time,
-        type_id,
-        0,
-        ore_price,
-        False
-    ))
+async def latest_sell_orders(type_id, market_db):
+    # The newest snapshot's sell orders for type_id, replayed from the newest file that has one
+    for path in partition_paths(market_db) or [market_db]:
+        rows = await get_pool([path]).fetchall("latest_order_snapshot", "SELECT MAX(timestamp) AS timestamp FROM order_snapshots")
+        if rows and rows[0]["timestamp"] is not None:
+            latest = rows[0]["timestamp"]
+            return await replay_file(path, type_id, latest, latest)
+    return []
 
+async def insert_type_snapshots(db, summary, fetched_time):
+    fetched_time = epoch_seconds(fetched_time)
+    await db.executemany("""
+        INSERT OR REPLACE INTO type_snapshots (timestamp, type_id, min_sell, max_buy, sell_volume, buy_volume, sell_orders, buy_orders)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, summary.snapshot_rows(fetched_time))
+
+async def snapshot_committed(db, fetched_time):
+    # Every snapshot commits its type_snapshots rows in the same transaction as its orders.
+    # Not an index seek (the key leads with type_id), so only asked when resuming after a crash.
+    async with db.execute("SELECT 1 FROM type_snapshots WHERE timestamp = ? LIMIT 1", (epoch_seconds(fetched_time),)) as cursor:
+        return await cursor.fetchone() is not None
+
+async def backfill_snapshot_rows(db):
+    # Summarising snapshots that were stored before type_snapshots existed (schema migration 7).
+    # Timestamps still stored as text (see migrate_timestamps.py) are converted on the way.
+    async with db.execute("""
+        INSERT OR IGNORE INTO type_snapshots (timestamp, type_id, min_sell, max_buy, sell_volume, buy_volume, sell_orders, buy_orders)
+        SELECT
+            CASE WHEN typeof(timestamp) = 'text' THEN CAST(strftime('%s', timestamp) AS INTEGER) ELSE timestamp END AS snapshot_time,
+            type_id,
+            MIN(CASE WHEN is_buy_order THEN NULL ELSE price END),
+            MAX(CASE WHEN is_buy_order THEN price END),
+            SUM(CASE WHEN is_buy_order THEN 0 ELSE volume_remain END),
+            SUM(CASE WHEN is_buy_order THEN volume_remain ELSE 0 END),
+            SUM(NOT is_buy_order),
+            SUM(is_buy_order)
+        FROM market_orders
+        GROUP BY snapshot_time, type_id
+    """) as cursor:
+        inserted = cursor.rowcount
+    # The rollups are built from type_snapshots, so they need the new rows too
+    if inserted:
+        await rebuild_rollups(db)
+    log.info(f"Backfilled {inserted} type snapshot rows")
+    return inserted
+
+async def backfill_type_snapshots(database_path):
     async with aiosqlite.connect(database_path) as db:
+        inserted = await backfill_snapshot_rows(db)
+        await db.commit()
+    return inserted
+
+async def save_orders(database_path, orders, fetched_time):
+    async with aiosqlite.connect(database_path) as db:
+        await insert_orders(db, orders, fetched_time, await market_orders_clustered(db))
+        await db.commit()
+        await db.close()
+
+async def query_newest_first(market_db, name, query, params):
+    # Latest-value lookups stop at the newest partition with an answer, which is nearly
+    # always the current one, so they never open the older (larger) files
+    for path in partition_paths(market_db) or [market_db]:
+        rows = await get_pool([path]).fetchall(name, query, params)
+        if rows:
+            return rows
+    return []
+
+async def pull_recent_data(type_id, market_db):
+    params = [type_id]
+
+    rows = await query_newest_first(market_db, "pull_recent_data", RECENT_DATA_QUERY, tuple(params))
+    if ORDER_STORAGE_MODE == "changes":
+        # market_orders only has the ore value, if this is an ore; the book itself is replayed
+        candidates = list(rows) + await latest_sell_orders(type_id, market_db)
+        if candidates:
+            latest = max(row["timestamp"] for row in candidates)
+            rows = [min((row for row in candidates if row["timestamp"] == latest), key=lambda row: row["price"])]
+    log.debug(f"Returning recent data for type id {type_id}: {rows}")
+    return rows
+
+async def insert_ore_orders(db, ore_prices, fetched_time, clustered=False):
+    # ore_prices is [(type_id, ore value)]. Each ore value goes in as one more sell order,
+    # in market_orders and in its type's summary alike.
+    fetched_time = epoch_seconds(fetched_time)
+    if clustered:
+        await db.executemany("""
+            INSERT OR REPLACE INTO market_orders (timestamp, type_id, order_id, volume_remain, price, is_buy_order)
+            VALUES (?, ?, 0, 0, ?, 0)
+        """, [(fetched_time, type_id, ore_price) for type_id, ore_price in ore_prices])
+    else:
         await db.executemany("""
             INSERT INTO market_orders (
                 timestamp, 
@@ -73,96 +445,103 @@ async def save_ore_orders(database_path, ore_price, fetched_time, type_id):
                 price, 
                 is_buy_order
             )
-            VALUES (?, ?, ?, ?, ?)
-        """, rows_to_insert)
+            VALUES (?, ?, 0, ?, 0)
+        """, [(fetched_time, type_id, ore_price) for type_id, ore_price in ore_prices])
+    await db.executemany("""
+        INSERT INTO type_snapshots (timestamp, type_id, min_sell, max_buy, sell_volume, buy_volume, sell_orders, buy_orders)
+        VALUES (?, ?, ?, NULL, 0, 0, 1, 0)
+        ON CONFLICT(type_id, timestamp) DO UPDATE SET
+            min_sell = MIN(COALESCE(min_sell, excluded.min_sell), excluded.min_sell),
+            sell_orders = sell_orders + 1
+    """, [(fetched_time, type_id, ore_price) for type_id, ore_price in ore_prices])
+
+async def save_ore_orders(database_path, ore_price, fetched_time, type_id):
+    async with aiosqlite.connect(database_path) as db:
+        await insert_ore_orders(db, [(type_id, ore_price)], fetched_time, await market_orders_clustered(db))
         await db.commit()
         await db.close()
 
 async def query_db_days(type_id, market_db, days):
+    start = window_start(days)
+    params = [type_id, start]
 
-    async with aiosqlite.connect(market_db) as db:
-        db.row_factory = aiosqlite.Row
+    resolution = rollup_resolution(days)
+    if resolution is not None:
+        # One row per bucket, its lowest sell standing in for that bucket's orders
+        rows = await query_rollups(type_id, market_db, start, resolution)
+        hot_start = rows[-1]["timestamp"] if rows else int(t.time())
+        rows = list(rows) + await archived_rollups(market_db, type_id, start, hot_start, resolution)
+        log.debug(f"Returning {resolution}s rollups for type id {type_id}")
+        return [{"timestamp": row["timestamp"], "price": row["low"], "volume_remain": row["volume"], "is_buy_order": 0} for row in rows]
 
-        query = """
-            SELECT 
-                timestamp,
-                price,
-                volume_remain,
-                is_buy_order
-            FROM market_orders
-            WHERE type_id = ?
-                AND is_buy_order = FALSE
-                AND timestamp >= datetime('now', '-' || ? || ' days')
-            ORDER BY timestamp DESC, price DESC
-        """
-    
-        params = [type_id, round(days*24)]
-
-        async with db.execute(query, tuple(params)) as cursor:
-            rows = await cursor.fetchall()
-            log.debug(f"Returning recent data for type id {type_id}")
-            return rows
+    rows = await range_pool(market_db, start=start).fetchall("query_db_days", DAYS_QUERY, tuple(params))
+    if ORDER_STORAGE_MODE == "changes":
+        rows = list(rows) + await replay_sell_orders(type_id, market_db, start)
+        rows.sort(key=lambda row: (row["timestamp"], row["price"]), reverse=True)
+    # Anything before the oldest live row comes from the cold archive, if it has been archived
+    hot_start = rows[-1]["timestamp"] if rows else int(t.time())
+    rows = list(rows) + await archived_sell_orders(market_db, type_id, start, hot_start)
+    log.debug(f"Returning recent data for type id {type_id}")
+    return rows
 
-async def lowest_price_per_day(type_id, market_db, days):
-    async with aiosqlite.connect(market_db) as db:
-        db.row_factory = aiosqlite.Row
-
-        query = """
-            SELECT 
-                DATE(timestamp) as order_date,
-                MIN(price) as lowest_price
-            FROM market_orders
-            WHERE type_id = ?
-                AND is_buy_order = FALSE
-                AND timestamp >= datetime('now', '-' || ? || ' days')
-            GROUP BY order_date
-            ORDER BY order_date DESC
-        """
-
-        params = [type_id, round(days*24)]
-
-        async with db.execute(query, tuple(params)) as cursor:
-            rows = await cursor.fetchall()
-            log.debug(f"Returning lowest price per day for type id {type_id}")
-            return rows
+async def min_sell_by_time(type_id, market_db, days):
+    # [(timestamp, lowest sell)] oldest first: one point per snapshot, or per rollup bucket
+    # (its lowest sell, at the bucket's start) when the window is long enough
+    start = window_start(days)
 
-async def pull_fitting_price_data(type_id, market_db):
-    query = """
-        SELECT timestamp, type_id, volume_remain, price, is_buy_order
-        FROM market_orders
-        WHERE type_id = ?
-          AND is_buy_order = 0
-        ORDER BY timestamp DESC, price ASC
-        LIMIT 1
-    """
+    resolution = rollup_resolution(days)
+    if resolution is not None:
+        rows = await query_rollups(type_id, market_db, start, resolution)
+        hot_start = rows[-1]["timestamp"] if rows else int(t.time())
+        rows = list(rows) + await archived_rollups(market_db, type_id, start, hot_start, resolution)
+        log.debug(f"Returning {len(rows)} {resolution}s rollup points for type id {type_id}")
+        return [(row["timestamp"], row["low"]) for row in reversed(rows)]
 
-    async with aiosqlite.connect(market_db, timeout=15) as conn:
-        conn.row_factory = aiosqlite.Row
-        await conn.execute("PRAGMA journal_mode=WAL;")
-        await conn.commit()
+    rows = await range_pool(market_db, start=start).fetchall("min_sell_by_time", MIN_SELL_BY_TIME_QUERY, (type_id, start))
+    # Snapshots older than the oldest live one come from the cold archive, if archived
+    hot_start = rows[0]["timestamp"] if rows else int(t.time())
+    archived = await archived_min_sell(market_db, type_id, start, hot_start)
+    log.debug(f"Returning {len(archived) + len(rows)} snapshot points for type id {type_id}")
+    return [(row["timestamp"], row["price"]) for row in archived] + [tuple(row) for row in rows]
 
-        async with conn.execute(query, (type_id,)) as cursor:
-            row = await cursor.fetchone()
-            return row
+async def lowest_price_per_day(type_id, market_db, days):
+    start = window_start(days)
+
+    # A daily rollup's low is that day's lowest sell, so this reads one row per day
+    # instead of grouping every snapshot in the window
+    rows = await range_pool(market_db, start=start).fetchall("lowest_price_per_day", LOWEST_PRICE_PER_DAY_QUERY, (type_id, start - start % 86400))
+    # Days before the oldest live one come from the cold archive, if they have been archived
+    hot_start = int(datetime.strptime(rows[-1]["order_date"], "%Y-%m-%d").replace(tzinfo=UTC).timestamp()) if rows else int(t.time())
+    rows = list(rows) + await archived_lowest_price_per_day(market_db, type_id, start, hot_start)
+    log.debug(f"Returning lowest price per day for type id {type_id}")
+    return rows
+
+async def pull_fitting_price_data(type_id, market_db):
+    rows = await query_newest_first(market_db, "pull_fitting_price_data", LATEST_PRICE_QUERY, (type_id,))
+    return rows[0] if rows else None
 
 async def get_volume(type_id):
     df = pd.read_csv(ITEM_IDS_VOLUME_FILE)
     result = df[df['typeID'] == type_id]['volume']
     return float(result.iloc[0])
 
+async def insert_mineral_prices(db, orders, fetched_time, reprocess_ids):
+    fetched_time = epoch_seconds(fetched_time)
+    mineral_orders = orders.with_type_ids(reprocess_ids)
+    log.debug(f"Staging {len(mineral_orders)} reprocessed material orders")
+
+    await db.executemany("""
+        INSERT INTO mineral_prices (
+            timestamp,
+            type_id, 
+            price
+        )
+        VALUES (?, ?, ?)
+    """, mineral_orders.price_rows(fetched_time))
+
 async def save_mineral_price(database_path, orders, fetched_time):
-    rows_to_insert = []
     reprocess_ids = await load_reprocess_ids()
     log.debug(f"Loaded reprocess_ids as {reprocess_ids}")
-    for order in orders:
-        type_id = order["type_id"]
-        if type_id in reprocess_ids:
-            log.debug(f"ID {type_id} is a reprocessed material, handling as such.")
-            rows_to_insert.append((
-                fetched_time,
-                type_id,
-                order["price"]
-            ))
 
     async with aiosqlite.connect(database_path) as db:
         await db.execute("""
@@ -172,38 +551,29 @@ async def save_mineral_price(database_path, orders, fetched_time):
                 price REAL NOT NULL
             )
         """)
-        await db.executemany("""
-            INSERT INTO mineral_prices (
-                timestamp,
-                type_id, 
-                price
-            )
-            VALUES (?, ?, ?)
-        """, rows_to_insert)
+        await insert_mineral_prices(db, orders, fetched_time, reprocess_ids)
         await db.commit()
         await db.close()
             
+async def load_staged_mineral_prices(db, fetched_time):
+    # {type_id: [price, ...]} for one snapshot, read on the connection that staged them
+    mineral_prices = defaultdict(list)
+    async with db.execute("SELECT type_id, price FROM mineral_prices WHERE timestamp = ?", (epoch_seconds(fetched_time),)) as cursor:
+        async for type_id, price in cursor:
+            mineral_prices[type_id].append(price)
+    return mineral_prices
+
+async def delete_mineral_prices(db):
+    await db.execute("""
+    DELETE FROM mineral_prices;
+    """)
+
 async def clear_mineral_table(database_path):
     async with aiosqlite.connect(database_path) as db:
-        await db.execute("""
-        DELETE FROM mineral_prices;
-        """)
+        await delete_mineral_prices(db)
         await db.commit()
         await db.close()
 
 async def query_recent_price(type_id, market_db):
-    async with aiosqlite.connect(market_db, timeout=15) as conn:
-        conn.row_factory = aiosqlite.Row
-
-        query = """
-            SELECT timestamp, type_id, volume_remain, price, is_buy_order
-            FROM market_orders
-            WHERE type_id = ?
-            AND is_buy_order = 0
-            ORDER BY timestamp DESC, price ASC
-            LIMIT 1
-        """
-
-        async with conn.execute(query, (type_id,)) as cursor:
-            row = await cursor.fetchone()
-            return row
+    rows = await query_newest_first(market_db, "query_recent_price", LATEST_PRICE_QUERY, (type_id,))
+    return rows[0] if rows else None
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import aiohttp
+from dotenv import load_dotenv
+from modules.utils.logging_setup import get_logger
+from modules.esi.rate_governor import esi_governor
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+log = get_logger("ESIClient")
+
+load_dotenv()
+ESI_HTTP_POOL_SIZE = int(os.getenv("ESI_HTTP_POOL_SIZE", 30))
+ESI_HTTP_TIMEOUT = float(os.getenv("ESI_HTTP_TIMEOUT", 10))
+ESI_HTTP_KEEPALIVE = float(os.getenv("ESI_HTTP_KEEPALIVE", 60))
+ESI_HTTP2 = os.getenv("ESI_HTTP2", "False") == "True"
+USER_AGENT = "LunaSkye Core (admin contact: skyemeadows20@gmail.com)"
+
+class ESIResponse:
+    """A fully read response, so callers never hold a pooled connection open."""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+class ESIClient:
+    """Every outbound call to ESI (and the EVE image server) goes through one of these,
+    so connections are kept alive and reused instead of re-doing TLS per request."""
+
+    def __init__(self, pool_size=ESI_HTTP_POOL_SIZE, timeout=ESI_HTTP_TIMEOUT, http2=ESI_HTTP2):
+        if http2 and httpx is None:
+            log.warning("ESI_HTTP2 is set but httpx is not installed, falling back to HTTP/1.1")
+        self.http2 = http2 and httpx is not None
+
+        # httpx multiplexes requests over one HTTP/2 connection per host, aiohttp keeps a
+        # pool of HTTP/1.1 keep-alive connections per host
+        if self.http2:
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=ESI_HTTP_KEEPALIVE)
+            self._client = httpx.AsyncClient(http2=True, headers={"User-Agent": USER_AGENT}, timeout=timeout, limits=limits)
+        else:
+            connector = aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size, keepalive_timeout=ESI_HTTP_KEEPALIVE, ttl_dns_cache=300)
+            self._client = aiohttp.ClientSession(headers={"User-Agent": USER_AGENT}, connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+        log.debug(f"Opened ESI client ({'HTTP/2' if self.http2 else 'HTTP/1.1'}, pool of {pool_size})")
+
+    async def request(self, method, url, headers=None, data=None, governed=True):
+        # ESI requests pass through the rate/error governor, the image server does not
+        if governed:
+            await esi_governor.acquire()
+        try:
+            if self.http2:
+                response = await self._client.request(method, url, headers=headers, data=data)
+                result = ESIResponse(response.status_code, response.headers, response.content)
+            else:
+                async with self._client.request(method, url, headers=headers, data=data) as response:
+                    result = ESIResponse(response.status, response.headers, await response.read())
+        except Exception:
+            # Requests that failed without a response still count against the error budget
+            if governed:
+                esi_governor.record_error()
+            raise
+
+        if governed:
+            esi_governor.observe(result.status, result.headers)
+        return result
+
+    async def get(self, url, headers=None, governed=True):
+        return await self.request("GET", url, headers=headers, governed=governed)
+
+    async def close(self):
+        if self.http2:
+            await self._client.aclose()
+        else:
+            await self._client.close()
+
+    @property
+    def closed(self):
+        return self._client.is_closed if self.http2 else self._client.closed
+
+# === Process-wide client, one per event loop ===
+# Sessions are bound to the loop they were opened on, and some scripts run more than
+# one asyncio.run() in the same process.
+_client = None
+_client_loop = None
+
+def get_esi_client():
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.closed or _client_loop is not loop:
+        _client = ESIClient()
+        _client_loop = loop
+    return _client
+
+async def close_esi_client():
+    global _client, _client_loop
+    if _client is not None and _client_loop is asyncio.get_running_loop() and not _client.closed:
+        await _client.close()
+    _client = None
+    _client_loop = None
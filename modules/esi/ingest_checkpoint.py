@@ -0,0 +1,76 @@
+import json
+import os
+from datetime import datetime, UTC
+import aiofiles
+from modules.utils.paths import CHECKPOINT_DIR
+from modules.utils.logging_setup import get_logger
+
+log = get_logger("IngestCheckpoint")
+
+class IngestCheckpoint:
+    """On-disk record of an ingest run in progress: its snapshot time and which pages are done.
+
+    The filtered orders of each completed page are already in the page cache, so the
+    manifest only has to say which cache entries belong to this run. A resumed run
+    reads those pages back instead of requesting them, and since nothing is committed
+    until the last page is written, the database never sees a half snapshot. A checkpoint
+    that outlives its committed snapshot is dropped by the pipeline on resume."""
+
+    def __init__(self, market, checkpoint_dir=CHECKPOINT_DIR):
+        self.market = market
+        self.path = checkpoint_dir / f"{market}.json"
+        self.fetched_time = None
+        self.expires = 0
+        self.pages = 0
+        self.completed = set()
+
+    async def load(self):
+        # Resuming only while ESI still serves the same version of the market; after that
+        # the saved pages would mix two versions of the book into one snapshot
+        if not self.path.exists():
+            return False
+        try:
+            async with aiofiles.open(self.path, "r", encoding="utf-8") as f:
+                state = json.loads(await f.read())
+        except Exception as e:
+            log.warning(f"Discarding unreadable {self.market} checkpoint: {e}")
+            return False
+
+        if state["expires"] <= datetime.now(UTC).timestamp():
+            log.debug(f"{self.market} checkpoint has expired, starting a fresh run")
+            await self.clear()
+            return False
+
+        self.fetched_time = datetime.fromtimestamp(state["fetched_time"], UTC)
+        self.expires = state["expires"]
+        self.pages = state["pages"]
+        self.completed = set(state["completed"])
+        log.info(f"Resuming {self.market} ingest from checkpoint: {len(self.completed)} of {self.pages} pages already done")
+        return True
+
+    async def start(self, fetched_time, expires, pages):
+        self.fetched_time = fetched_time
+        self.expires = expires
+        self.pages = pages
+        await self.save()
+
+    async def complete_page(self, page):
+        self.completed.add(page)
+        await self.save()
+
+    async def save(self):
+        state = {
+            "fetched_time": self.fetched_time.timestamp(),
+            "expires": self.expires,
+            "pages": self.pages,
+            "completed": sorted(self.completed),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+            await f.write(json.dumps(state, separators=(",", ":")))
+        os.replace(tmp_path, self.path)
+
+    async def clear(self):
+        self.path.unlink(missing_ok=True)
+        self.completed = set()
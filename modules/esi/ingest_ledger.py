@@ -0,0 +1,81 @@
+import time as t
+import aiosqlite
+from modules.utils.logging_setup import get_logger
+
+log = get_logger("IngestLedger")
+
+# Column name -> SQL type for each ingest_runs row, in table order
+INGEST_RUN_COLUMNS = {
+    "market": "TEXT NOT NULL",
+    "status": "TEXT NOT NULL",
+    "error": "TEXT",
+    "started_at": "REAL NOT NULL",
+    "finished_at": "REAL",
+    "snapshot_time": "INTEGER",
+    "pages": "INTEGER NOT NULL",
+    "pages_200": "INTEGER NOT NULL",
+    "pages_304": "INTEGER NOT NULL",
+    "pages_cached": "INTEGER NOT NULL",
+    "request_errors": "INTEGER NOT NULL",
+    "bytes_downloaded": "INTEGER NOT NULL",
+    "orders_received": "INTEGER NOT NULL",
+    "orders_discarded": "INTEGER NOT NULL",
+    "orders_duplicate": "INTEGER NOT NULL",
+    "orders_kept": "INTEGER NOT NULL",
+    "fetch_seconds": "REAL NOT NULL",
+    "filter_seconds": "REAL NOT NULL",
+    "save_orders_seconds": "REAL NOT NULL",
+    "save_minerals_seconds": "REAL NOT NULL",
+    "ore_seconds": "REAL NOT NULL",
+}
+
+class IngestRunStats:
+    """Counters and stage timings for one market's ingest run, filled in by the pipeline
+    stages as they go and written to ingest_runs when the run ends."""
+
+    def __init__(self, market):
+        for name in INGEST_RUN_COLUMNS:
+            setattr(self, name, 0)
+        self.market = market
+        self.status = "running"
+        self.error = None
+        self.started_at = t.time()
+        self.finished_at = None
+        self.snapshot_time = None
+
+    def record_page(self, result):
+        # result is a page as handed from the fetch stage to the filter stage
+        self.pages += 1
+        self.request_errors += result.get("errors", 0)
+        if result.get("from_cache"):
+            self.pages_cached += 1
+        elif result["raw"] is not None:
+            self.pages_200 += 1
+            self.orders_received += len(result["raw"])
+        else:
+            self.pages_304 += 1
+        self.bytes_downloaded += result.get("bytes", 0)
+
+    def finish(self, error=None):
+        self.finished_at = t.time()
+        self.status = "failed" if error else "ok"
+        self.error = repr(error) if error else None
+
+    def as_row(self):
+        snapshot_time = int(self.snapshot_time.timestamp()) if self.snapshot_time else None
+        return tuple(snapshot_time if name == "snapshot_time" else getattr(self, name) for name in INGEST_RUN_COLUMNS)
+
+async def create_ingest_runs_table(db):
+    columns = ",\n".join(f"{name} {sql_type}" for name, sql_type in INGEST_RUN_COLUMNS.items())
+    await db.execute(f"CREATE TABLE IF NOT EXISTS ingest_runs (\n{columns}\n)")
+
+async def save_ingest_run(database_path, stats):
+    async with aiosqlite.connect(database_path) as db:
+        await create_ingest_runs_table(db)
+        placeholders = ", ".join("?" for _ in INGEST_RUN_COLUMNS)
+        await db.execute(f"INSERT INTO ingest_runs ({', '.join(INGEST_RUN_COLUMNS)}) VALUES ({placeholders})", stats.as_row())
+        await db.commit()
+    log.debug(
+        f"{stats.market} run {stats.status}: {stats.pages} pages ({stats.pages_200} new, {stats.pages_304} unchanged, {stats.pages_cached} cached), "
+        f"{stats.orders_kept} orders kept, fetch {stats.fetch_seconds:.2f}s, save {stats.save_orders_seconds:.2f}s, ore {stats.ore_seconds:.2f}s"
+    )
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time as t
+from datetime import datetime, UTC
+import aiosqlite
+from dotenv import load_dotenv
+from modules.utils.logging_setup import get_logger
+from modules.utils.ore_controller import load_reprocess_ids
+import numpy as np
+from modules.esi.snapshot_writer import SnapshotWriter
+from modules.esi.data_control import snapshot_committed, ORDER_STORAGE_MODE
+from modules.esi.page_cache import load_cached_page, is_fresh
+from modules.esi.ingest_checkpoint import IngestCheckpoint
+from modules.esi.ingest_ledger import IngestRunStats
+from modules.esi.order_batch import OrderBatch, BASE_COLUMNS, decoded_columns
+from modules.esi.order_fetcher import (
+    ESI_BASE_URL, ESI_FETCH_CONCURRENCY, OVERRIDE_MAX_ESI_PAGES,
+    request_page, resolve_page,
+)
+from modules.esi.esi_client import get_esi_client
+
+log = get_logger("IngestPipeline")
+
+load_dotenv()
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 8))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 5000))
+
+# Ingest runs as three stages joined by bounded queues:
+#   fetch (N workers) -> page_queue -> filter -> order_queue -> writer
+# A full queue makes the stage before it wait, so at most a few pages are held in
+# memory at once no matter how many pages the region has.
+
+async def fetch_one(session, token, market, page, base_url, use_cache, done_pages=(), columns=BASE_COLUMNS):
+    cached = await load_cached_page(market, page, columns=columns) if use_cache else None
+    if cached and (page in done_pages or is_fresh(cached)):
+        log.debug(f"Cache entry for {market} page {page} is still current, skipping request")
+        return {"page": page, "pages": cached["pages"], "etag": cached["etag"], "expires": cached["expires"], "raw": None, "cached": cached, "from_cache": True}
+    return await request_page(session, token, market, page, cached, base_url)
+
+async def fetch_stage(session, token, market, first_result, last_page, page_queue, concurrency, base_url, use_cache, done_pages, stats, columns):
+    # Wall time from here until the last page is fetched, including any wait on a full queue
+    start = t.perf_counter()
+    await page_queue.put(first_result)
+    page_numbers = iter(range(first_result["page"] + 1, last_page + 1))
+
+    async def worker():
+        for page in page_numbers:
+            result = await fetch_one(session, token, market, page, base_url, use_cache, done_pages, columns)
+            await page_queue.put(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    except Exception as e:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Handing the error down the queue instead of raising, so the pages fetched
+        # before it are still filtered and checkpointed before the run fails
+        await page_queue.put(e)
+        return
+    finally:
+        stats.fetch_seconds += t.perf_counter() - start
+    await page_queue.put(None)
+
+async def filter_stage(market, page_queue, order_queue, use_cache, checkpoint, stats, columns):
+    pages_done = 0
+    while True:
+        result = await page_queue.get()
+        if result is None:
+            break
+        if isinstance(result, Exception):
+            raise result
+        start = t.perf_counter()
+        orders = await resolve_page(result, market, use_cache, columns)
+        stats.filter_seconds += t.perf_counter() - start
+        stats.record_page(result)
+        if result["raw"] is not None:
+            stats.orders_discarded += len(result["raw"]) - len(orders)
+        # The page's orders are in the page cache now, so a resumed run can pick them up from there
+        if checkpoint is not None and result["page"] not in checkpoint.completed:
+            await checkpoint.complete_page(result["page"])
+        await order_queue.put(orders)
+        pages_done += 1
+    log.debug(f"Filtered {pages_done} {market} pages")
+    await order_queue.put(None)
+
+async def write_stage(database_path, fetched_time, order_queue, reprocess_ids, ore_list, batch_size, db, storage_mode, stats):
+    seen_order_ids = set()
+
+    # One connection and one transaction for the whole snapshot, ore values included: rows
+    # land in the database as pages arrive, but readers never see a half-written snapshot.
+    async with SnapshotWriter(database_path, fetched_time, storage_mode, reprocess_ids, db=db, stats=stats) as writer:
+        pending = []
+        pending_count = 0
+        while True:
+            orders = await order_queue.get()
+            if orders is not None:
+                pending.append(orders)
+                pending_count += len(orders)
+            if pending_count and (orders is None or pending_count >= batch_size):
+                # Dropping orders already written from an earlier page of this snapshot
+                batch = OrderBatch.concat(pending).unique_orders()
+                order_ids = batch.order_id.tolist()
+                batch = batch.select(np.fromiter((order_id not in seen_order_ids for order_id in order_ids), dtype=bool, count=len(order_ids)))
+                seen_order_ids.update(order_ids)
+                stats.orders_duplicate += pending_count - len(batch)
+
+                await writer.write_orders(batch)
+                pending = []
+                pending_count = 0
+            if orders is None:
+                break
+        await writer.commit(ore_list)
+
+    return writer.orders_written
+
+async def already_written(database_path, fetched_time, db=None):
+    if db is not None:
+        return await snapshot_committed(db, fetched_time)
+    async with aiosqlite.connect(database_path) as db:
+        return await snapshot_committed(db, fetched_time)
+
+async def run_stages(*coroutines):
+    # Running every stage at once; the first one to fail cancels the rest
+    tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return [task.result() for task in tasks]
+
+async def run_ingest_pipeline(token, market, database_path, stage_minerals=True, concurrency=ESI_FETCH_CONCURRENCY, base_url=ESI_BASE_URL, use_cache=True, session=None, db=None, storage_mode=ORDER_STORAGE_MODE, fetched_time=None, stats=None, ore_list=()):
+    # A long-running caller can hand in its own DB connection; HTTP goes through the shared pooled
+    # client unless a stand-in (e.g. page_recorder.ReplayClient) is passed as the session.
+    # Ores in ore_list are valued from this snapshot's minerals and committed along with it.
+    reprocess_ids = set(await load_reprocess_ids()) if stage_minerals else set()
+    page_queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    order_queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+
+    # Only changes-only storage needs each order's issued time and duration decoded
+    columns = decoded_columns(storage_mode)
+
+    session = session or get_esi_client()
+    # Callers that keep a run ledger pass their own stats; it is filled in as the stages run
+    stats = stats or IngestRunStats(market)
+
+    # === Picking up an interrupted run of this market, if ESI has not moved on since ===
+    checkpoint = IngestCheckpoint(market) if use_cache else None
+    resumed = checkpoint is not None and await checkpoint.load()
+    done_pages = checkpoint.completed if resumed else set()
+    # A crash between the snapshot's commit and clearing its checkpoint leaves a checkpoint
+    # for a snapshot the database already has; writing it again would duplicate its orders
+    if resumed and await already_written(database_path, checkpoint.fetched_time, db):
+        log.info(f"{market} snapshot from checkpoint was already committed, not writing it again")
+        await checkpoint.clear()
+        stats.snapshot_time = checkpoint.fetched_time
+        return 0, checkpoint.fetched_time, checkpoint.expires + 3
+
+    # === First page tells us how many pages exist, stamps the snapshot and says when the next one is due ===
+    start = t.perf_counter()
+    first_result = await fetch_one(session, token, market, 1, base_url, use_cache, done_pages, columns)
+    stats.fetch_seconds += t.perf_counter() - start
+    next_fetch = first_result["expires"] + 3
+    last_page = first_result["pages"]
+    if resumed:
+        fetched_time = checkpoint.fetched_time
+    else:
+        fetched_time = fetched_time or datetime.now(UTC)
+        if checkpoint is not None:
+            await checkpoint.start(fetched_time, first_result["expires"], last_page)
+    stats.snapshot_time = fetched_time
+    if OVERRIDE_MAX_ESI_PAGES != 0:
+        last_page = min(last_page, OVERRIDE_MAX_ESI_PAGES)
+    log.debug(f"{market} has {last_page} pages, streaming with concurrency {concurrency}")
+
+    _, _, orders_written = await run_stages(
+        fetch_stage(session, token, market, first_result, last_page, page_queue, concurrency, base_url, use_cache, done_pages, stats, columns),
+        filter_stage(market, page_queue, order_queue, use_cache, checkpoint, stats, columns),
+        write_stage(database_path, fetched_time, order_queue, reprocess_ids, ore_list, INGEST_BATCH_SIZE, db, storage_mode, stats),
+    )
+
+    # The snapshot is committed, so there is nothing left to resume
+    if checkpoint is not None:
+        await checkpoint.clear()
+
+    stats.orders_kept += orders_written
+    log.info(f"Wrote {orders_written} {market} orders over {last_page} pages")
+    return orders_written, fetched_time, next_fetch
@@ -1,18 +1,25 @@
-from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX, RUNTIME_CACHE_PATH
 from modules.utils.logging_setup import get_logger
 from dotenv import load_dotenv
-import json
 import time as t
-from datetime import datetime, timedelta, UTC
-from email.utils import parsedate_to_datetime
+from datetime import datetime, UTC
 import os
-import requests
 import asyncio
-from modules.esi.session_control import load_cache_time, load_esi_token
-from modules.esi.at_manager import establish_esi_session, test_esi_status
-from modules.esi.data_control import save_orders, save_ore_orders, clear_mineral_table, save_mineral_price
-from modules.utils.ore_controller import load_ore_list, calculate_ore_value
+import argparse
+import aiosqlite
+from modules.esi.session_control import load_cache_time, save_cache_time
+from modules.esi.at_manager import TokenManager, test_esi_status
+from modules.esi.ingest_pipeline import run_ingest_pipeline
+from modules.esi.order_fetcher import ESISessionError
+from modules.esi.esi_client import get_esi_client, close_esi_client
+from modules.esi.page_recorder import RecordingClient
+from modules.esi.ingest_ledger import IngestRunStats, save_ingest_run
+from modules.utils.ore_controller import load_ore_list
 from modules.utils.init_db import init_db
+from modules.utils.db_partitions import partition_path, drop_old_partitions, month_index
+from modules.utils.order_archive import ARCHIVE_COLD_DATA, archive_market
+from modules.utils.data_prune import PRUNE_BUDGET_SECONDS, prune_market
+from modules.utils.compact_db import COMPACT_INTERVAL_HOURS, compact_market
 
 log = get_logger("MarketRequestor")
 
@@ -38,182 +45,150 @@ else:
     query_plex_bool = False
 last_esi_status_check_time = 0
 cached_status = None
-OVERRIDE_MAX_ESI_PAGES = int(os.getenv("OVERRIDE_MAX_ESI_PAGES"))
+DAEMON_RETRY_SECONDS = int(os.getenv("DAEMON_RETRY_SECONDS", 60))
 
-jita_region_id = 10000002 # The Forge
-jita_hub_station_id = 60003760 # Jita 4-4
-gsf_structure_id = 1049588174021 # C-J Keepstar
+def market_cache_path(market):
+    return RUNTIME_CACHE_PATH.with_name(f"runtime_cache_{market}.txt")
 
-class ESISessionError(Exception):
-    def __init__(self, message, errors=None):
-        super().__init__(message)
-        self.errors = errors
-
-async def fetch_all_orders(token, market, on_page=1):
-    
-    # === Checking to see if resuming from other page ===
-    if on_page != 1:
-        pages_completed = on_page - 1
-    else:
-        pages_completed = 0
-
-    # === Initilization placeholders ===
-    ESI_MAX_PAGES = 1 
-    ETAG = None
-    raw_entries = []
-    
+async def respect_esi_cache(market):
     # === Checking last run time to ensure not over-using ESI resources ===
-    last_fetch_time, nextFetch = await load_cache_time()
+    last_fetch_time, nextFetch = await load_cache_time(market_cache_path(market))
     now = int(datetime.now(UTC).timestamp())
     if now < nextFetch:
         sleep_for = (nextFetch - now) + 3
-        log.debug(f"Respecting ESI cache: sleeping {sleep_for:.1f}s before fetching page {on_page}")
+        log.debug(f"Respecting ESI cache for {market}: sleeping {sleep_for:.1f}s")
         await asyncio.sleep(sleep_for)
 
-    # === === ===
-    # Running main loop to gather ESI data
-    # === === ===
-    while (((OVERRIDE_MAX_ESI_PAGES == 0) or (pages_completed < OVERRIDE_MAX_ESI_PAGES)) and (pages_completed < ESI_MAX_PAGES)):
-        
-        # === Establishing ESI Headers to ensure compliance ===
-        log.debug("Establishing ESI Headers")
-        headers = {
-            "Authorization": f'Bearer {token["access_token"]}',
-            "Content-Type": "application/json",
-            "User-Agent": "LunaSkye Core (admin contact: skyemeadows20@gmail.com)",
-            "If-None-Match": ETAG
-        }
-        url_gsf = f"https://esi.evetech.net/markets/structures/{gsf_structure_id}?page={on_page}"
-        url_jita = f"https://esi.evetech.net/latest/markets/10000002/orders/?order_type=all&page={on_page}"
-        url_plex = f"https://esi.evetech.net/latest/markets/19000001/orders/?order_type=all&page={on_page}"
-        page_data = []
-
-        # === Setting the request URL to match the intended market ===
-        log.debug(f"Establishing correct URL for {market}")
-        if market == "gsf":
-            url = url_gsf
-            log.debug("URL set to GSF URL")
-        elif market == "jita":
-            url = url_jita
-            log.debug("URL set to Jita URL")
-        elif market == "plex":
-            url = url_plex
-            log.debug("URL set to PLEX URL")
-        else:
-            log.warning("All Markets completed, but scripted is attempting to run again")
-            break
-
-        # === Attempting to gather ESI Data ===
-        try:
-            # Makes Request
-            response = requests.get(url, headers=headers, timeout=10)
-            log.debug(f"Response code from page {on_page}: {response.status_code}")
-
-            # If Token is expire, malformed, or otherwise invalid
-            if response.status_code == 401:
-                log.error(f"Recieved 401 response, token is invalid")
-                raise ESISessionError(f"ESI Token Invalid, on page {on_page}", errors=on_page)
-
-            # Setting error limits
-            
-            allowed_errors_left = int(response.headers.get("X-ESI-Error-Limit-Remain", 100))
-            log.debug(f"ESI Allowed Errors Remaining: {allowed_errors_left}")
-            error_reset = int(response.headers.get("X-ESI-Error-Limit-Reset", 300))
-            log.debug(f"ESI Error Limit Reset in: {error_reset} seconds")
-
-            # Finding how many pages are avilable and setting the max page limit to be equal to it.
-            ESI_MAX_PAGES = int(response.headers.get("X-Pages"))
-            log.debug(f"On page {on_page} of {ESI_MAX_PAGES} | {ESI_MAX_PAGES - on_page} pages left")
-
-            # Getting when the data expires to know when it can be checked next
-            expires_header = response.headers.get("expires")
-            log.debug(f"expires header: {expires_header}")
-            server_time = response.headers.get("Date")
-            log.debug(f"Server time header: {server_time}")
-            expires_dt = parsedate_to_datetime(response.headers.get("expires", ""))
-            last_fetch_time = datetime.now(UTC)
-            nextAllowedFetch = expires_dt + timedelta(seconds=3)
+async def ingest_market(market, database_path, ore_list, session_state, db=None):
+    log.debug(f"Attemtping to gather {market} data")
 
-            # Only setting next allowed fetch if it is not already set (to avoid overriding the actual earliest time it can be fetched again)
-            if nextAllowedFetch.tzinfo is None:
-                nextAllowedFetch = nextAllowedFetch.replace(tzinfo=UTC)
-            nextFetch = nextAllowedFetch.timestamp()
+    # Orders and mineral staging are streamed into the database while pages download
+    stage_minerals = market != "plex"
+    # The token manager is refreshed in the background, so a 401 should only happen if ESI revoked the token
+    token_manager = session_state["token"]
+    access_token = token_manager["access_token"]
 
-            # Checkign ETAG to ensure page is not duplicate
-            if response.headers.get("ETag") != ETAG:
-                ETAG = response.headers.get("ETag")
-                log.debug(f"ETag for page {on_page} set to {ETAG}")
-            else:
-                log.debug(f"ETag for page {on_page} unchanged.")
+    # Recording needs the body of every page, so the page cache is bypassed while recording
+    session = session_state["http"]
+    use_cache = not session_state["record"]
+    if session_state["record"]:
+        session = RecordingClient(session, market)
 
-            # 200 OK
-            if response.status_code == 200:
-                page_data = response.json()
-                raw_entries.extend(page_data)
-
-            # 3XX - Data is elsewhere
-            elif response.status_code == 304:
-                log.debug(f"Received 304 for Jita Order on Page {on_page}.")
-
-            # ??? - Unhandled Error
-            else:
-                log.error(f"Received unhandled response code {response.status_code} when fetching Jita orders on page {on_page}")
-                raise Exception(f"Unhandled response code: {response.status_code}")
+    # Ore values are derived from the mineral prices of this snapshot (PLEX has no minerals)
+    # and written in the snapshot's own transaction
+    ore_values = ore_list if stage_minerals else []
 
+    # Every run leaves one row in the market's ingest_runs table, failed runs included
+    stats = IngestRunStats(market)
+    try:
+        try:
+            orders_written, last_fetch_time, next_fetch = await run_ingest_pipeline(token_manager, market, database_path, stage_minerals, use_cache=use_cache, session=session, db=db, stats=stats, ore_list=ore_values)
         except ESISessionError as e:
-            raise
-
-        # Counting errors to ensure I don't anger the ESI gods
-        except Exception as e:
-            log.error(f"Error fetching {market} orders on page {on_page}: {e}")
-            allowed_errors_left -= 1
-            continue
-        if allowed_errors_left <= 5:
-            log.warning(f"Approaching ESI error limit, pausing for {error_reset} seconds")
-            await t.sleep(error_reset + 1)
-        if allowed_errors_left <= 0:
-            log.critical(f"Exceeded maximum allowed errors when fetching Jita orders")
-            break
-
-        # Successfully made it through a page, counting up and will move to next page if next page exists
-        pages_completed += 1
-        on_page += 1
-    # === === ===
-    # Main Loop Complete
-    # === === ===
-    
-    # === Returning data in List format ===
-    # Transforming data in json
-    if isinstance(raw_entries, bytes):
-        raw_entries = json.loads(raw_entries.decode('utf-8'))
-
-    # Appending each orders' contents to LIST format
-    orders = []
-    for order in raw_entries:
-        if (market == "gsf") or order.get("location_id") == jita_hub_station_id:
-            orders.append({
-                "type_id": order.get("type_id"),
-                "volume_remain": order.get("volume_remain"),
-                "price": order.get("price"),
-                "is_buy_order": order.get("is_buy_order"),
-            })
-    
-    # Returning the list of orders & the time at which all data can be fetched again
-    return orders, last_fetch_time
-
-
-
-async def main():
-    log.info("Starting market requestor")
+            # Nothing was committed, and the pages already fetched are still fresh in the page cache
+            log.warning(f"Recieved ESISessionError as {e}")
+            await token_manager.refresh(access_token)
+            log.info(f"Attempting to restart query for {market} (failed on page {e.errors})")
+            orders_written, last_fetch_time, next_fetch = await run_ingest_pipeline(token_manager, market, database_path, stage_minerals, use_cache=use_cache, session=session, db=db, stats=stats, ore_list=ore_values)
+    except Exception as e:
+        stats.finish(e)
+        await save_ingest_run(database_path, stats)
+        raise
+    stats.finish()
+    await save_ingest_run(database_path, stats)
+
+    await save_cache_time(last_fetch_time, next_fetch, market_cache_path(market))
+    log.info(f"Completed {market} Query")
+    return next_fetch
+
+async def open_partition(database_path):
+    # The file this market's snapshots go to right now, created and migrated on first use
+    partition = partition_path(database_path)
+    if not partition.exists():
+        log.info(f"Starting new partition {partition.name}")
+    await init_db(partition)
+    return partition
+
+async def archive_and_retain(database_path, limit=None):
+    # Archives finished months (at most `limit` of them), then drops partitions past retention
+    # once the archive has caught up, so no month is dropped before it is archived. Returns
+    # whether the archive has caught up.
+    if ARCHIVE_COLD_DATA:
+        written = await archive_market(database_path, limit=limit)
+        if limit is not None and len(written) >= limit:
+            return False
+    drop_old_partitions(database_path)
+    return True
+
+async def market_daemon_loop(market, database_path, ore_list, session_state):
+    # One long-lived connection per market, reopened when a new partition starts;
+    # the next pull is scheduled from ESI's Expires header
+    db = None
+    db_path = None
+    last_compaction = t.monotonic()
+    archived_month = None
+    try:
+        _, next_fetch = await load_cache_time(market_cache_path(market))
+        while True:
+            sleep_for = next_fetch - datetime.now(UTC).timestamp()
+            if sleep_for > 0:
+                log.debug(f"Next {market} pull in {sleep_for:.0f}s")
+                await asyncio.sleep(sleep_for)
+            try:
+                if partition_path(database_path) != db_path:
+                    if db is not None:
+                        await db.close()
+                    db_path = await open_partition(database_path)
+                    db = await aiosqlite.connect(db_path)
+                next_fetch = await ingest_market(market, db_path, ore_list, session_state, db=db)
+            except Exception as e:
+                log.error(f"{market} ingest failed, retrying in {DAEMON_RETRY_SECONDS}s: {e!r}")
+                next_fetch = datetime.now(UTC).timestamp() + DAEMON_RETRY_SECONDS
+                continue
+
+            # Each month is archived once it is over, one month per pull, so a backlog (the first
+            # run with ARCHIVE_COLD_DATA on) is worked through without holding up the pulls
+            if month_index(t.time()) != archived_month:
+                try:
+                    if await archive_and_retain(database_path, limit=1):
+                        archived_month = month_index(t.time())
+                except Exception as e:
+                    log.error(f"{market} archiving failed: {e!r}")
+
+            # Some of the wait for the next pull goes on thinning old orders, a batch at a time
+            budget = min(PRUNE_BUDGET_SECONDS, next_fetch - datetime.now(UTC).timestamp())
+            if budget > 0:
+                try:
+                    await prune_market(database_path, budget)
+                except Exception as e:
+                    log.error(f"{market} pruning failed: {e!r}")
+
+            # Compaction rewrites the files in place, so it only runs here, where this market's
+            # ingest is known to be idle; the pull it overruns into just starts late
+            if COMPACT_INTERVAL_HOURS > 0 and t.monotonic() - last_compaction >= COMPACT_INTERVAL_HOURS * 3600:
+                last_compaction = t.monotonic()
+                try:
+                    await compact_market(database_path)
+                except Exception as e:
+                    log.error(f"{market} compaction failed: {e!r}")
+    finally:
+        if db is not None:
+            await db.close()
+
+async def main(daemon=False, record=False):
+    log.info("Starting market requestor" + (" (daemon mode)" if daemon else ""))
 
     # Checking ESI Status
     try:
         log.debug(f"Attempting to test ESI Status")
-        ESI_online, token = await test_esi_status()
+        ESI_online, _ = await test_esi_status()
         log.debug(f"ESI Online?: {ESI_online}")
     except Exception as e:
         log.critical(f"Failed to establish ESI session, exception: {e}")
 
+    # Every fetcher reads the token through the manager, which keeps it fresh in the background
+    token_manager = TokenManager()
+    await token_manager.start()
+
     # Loading TypeID list for all ORE IDs
     log.debug(f"Loading ore list")
     ore_list = await load_ore_list()
@@ -223,82 +198,50 @@ async def main():
     log.debug(f"Boolean to for checking GSF is {query_gsf_bool}")
     log.debug(f"Boolean to for checking PLEX is {query_plex_bool}")
 
-    if query_jita_bool == True:
-        log.debug(f"Attemtping to gather Jita data")
-        await init_db(MARKET_DB_FILE_JITA)    
-        # Attempting to Gather Jita Data
-        try:
-            jita_orders, last_fetch_time = await fetch_all_orders(token, "jita")
-            await save_orders(MARKET_DB_FILE_JITA, jita_orders, last_fetch_time)
-            await save_mineral_price(MARKET_DB_FILE_JITA, jita_orders, last_fetch_time)
-            for ore_id in ore_list:
-                ore_price = await calculate_ore_value(ore_id, MARKET_DB_FILE_JITA)
-                await save_ore_orders(MARKET_DB_FILE_JITA, ore_price, last_fetch_time, ore_id)
-            await clear_mineral_table(MARKET_DB_FILE_JITA)
-            log.info(f"Completed Jita Query")
-        except ESISessionError as e:
-            log.warning(f"Recieved ESISessionError as {e}")
-            if e.errors:
-                log.debug(f"Failed on page {e.errors}")
-                on_page = e.errors
-            log.debug("Attemping to re-establish ESI Session")
-            await establish_esi_session()
-            token = await load_esi_token()
-            log.info(f"Attempting to resume query where left off for jita (page {on_page})")
-            await fetch_all_orders(token, "jita", on_page)
-    
-    if query_gsf_bool == True:
-        log.debug(f"Attemtping to gather GSF data")
-        await init_db(MARKET_DB_FILE_GSF)
-        # Attempting to Gather GSF Data
-        try:
-            log.debug(f"Attempting to fetch all orders for GSF with token {token}")
-            gsf_orders, last_fetch_time = await fetch_all_orders(token, "gsf")
-            await save_orders(MARKET_DB_FILE_GSF, gsf_orders, last_fetch_time)
-            await save_mineral_price(MARKET_DB_FILE_GSF, gsf_orders, last_fetch_time)
-            for ore_id in ore_list:
-                ore_price = await calculate_ore_value(ore_id, MARKET_DB_FILE_GSF)
-                await save_ore_orders(MARKET_DB_FILE_GSF, ore_price, last_fetch_time, ore_id)
-            await clear_mineral_table(MARKET_DB_FILE_GSF)
-            log.info(f"Completed GSF Query")
-        except ESISessionError as e:
-            log.warning(f"Recieved ESISessionError as {e}")
-            if e.errors:
-                log.debug(f"Failed on page {e.errors}")
-                on_page = e.errors
-            log.debug("Attemping to re-establish ESI Session")
-            await establish_esi_session()
-            token = await load_esi_token()
-            log.info(f"Attempting to resume query where left off for GSF (page {on_page})")
-            gsf_orders, last_fetch_time = await fetch_all_orders(token, "gsf", on_page)
-            await save_orders(MARKET_DB_FILE_GSF, gsf_orders, last_fetch_time)
-            await save_mineral_price(MARKET_DB_FILE_GSF, gsf_orders, last_fetch_time)
-            for ore_id in ore_list:
-                ore_price = await calculate_ore_value(ore_id, MARKET_DB_FILE_GSF)
-                await save_ore_orders(MARKET_DB_FILE_GSF, ore_price, last_fetch_time, ore_id)
-            await clear_mineral_table(MARKET_DB_FILE_GSF)
+    markets = {
+        "jita": (query_jita_bool, MARKET_DB_FILE_JITA),
+        "gsf": (query_gsf_bool, MARKET_DB_FILE_GSF),
+        "plex": (query_plex_bool, MARKET_DB_FILE_PLEX),
+    }
+    enabled = [(market, database_path) for market, (enabled_bool, database_path) in markets.items() if enabled_bool]
+    for market, database_path in enabled:
+        # The pre-partitioning file is still read from, so it is kept on the current schema too
+        if database_path.exists():
+            await init_db(database_path)
+
+    # Every market shares the process-wide pooled ESI client
+    session_state = {"token": token_manager, "http": get_esi_client(), "record": record}
+
+    if daemon:
+        await asyncio.gather(*(market_daemon_loop(market, database_path, ore_list, session_state) for market, database_path in enabled))
+
+    async def run_once(market, database_path):
+        await respect_esi_cache(market)
+        new_partition = not partition_path(database_path).exists()
+        await ingest_market(market, await open_partition(database_path), ore_list, session_state)
+        # Only once this month's first snapshot is in
+        if new_partition:
+            await archive_and_retain(database_path)
+
+    # Each market writes to its own database, so they can all run at once.
+    # return_exceptions keeps one market's failure from cancelling the others.
+    results = await asyncio.gather(
+        *(run_once(market, database_path) for market, database_path in enabled),
+        return_exceptions=True
+    )
+    for (market, _), result in zip(enabled, results):
+        if isinstance(result, Exception):
+            log.error(f"{market} ingest failed: {result!r}")
+
+    await token_manager.stop()
+    await close_esi_client()
+    exit(0)
 
-    if query_plex_bool == True:
-        # Attempting to Gather PLEX Data
-        log.debug(f"Attemtping to gather PLEX data")  
-        await init_db(MARKET_DB_FILE_PLEX)
-        try:
-            log.debug(f"Attempting to fetch all orders for PLEX with token {token}")
-            plex_orders, last_fetch_time = await fetch_all_orders(token, "plex")
-            await save_orders(MARKET_DB_FILE_PLEX, plex_orders, last_fetch_time)
-            log.info(f"Completed PLEX Query")
-        except ESISessionError as e:
-            log.warning(f"Recieved ESISessionError as {e}")
-            if e.errors:
-                log.debug(f"Failed on page {e.errors}")
-                on_page = e.errors
-            log.debug("Attemping to re-establish ESI Session")
-            await establish_esi_session()
-            token = await load_esi_token()
-            log.info(f"Attempting to resume query where left off for PLEX (page {on_page})")
-            plex_orders, last_fetch_time = await fetch_all_orders(token, "plex", on_page)
-            await save_orders(MARKET_DB_FILE_PLEX, plex_orders, last_fetch_time)
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Pull market orders from ESI into the market databases.")
+    parser.add_argument("--daemon", action="store_true", help="Stay resident and pull each market again as soon as ESI publishes new data")
+    parser.add_argument("--record", action="store_true", help="Also save every raw page to data/esi_recordings for replay (see page_recorder.py)")
+    args = parser.parse_args()
 
-    exit(0)
-    
-asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(daemon=args.daemon, record=args.record))
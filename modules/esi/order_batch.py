@@ -0,0 +1,234 @@
+from itertools import repeat
+from operator import itemgetter
+import numpy as np
+
+# Column name -> dtype for every field kept from an ESI order
+ORDER_COLUMNS = {
+    "order_id": np.int64,
+    "type_id": np.int64,
+    "volume_remain": np.int64,
+    "price": np.float64,
+    "is_buy_order": np.bool_,
+    "location_id": np.int64,
+    "issued": np.int64, # Unix seconds
+    "duration": np.int64,
+}
+# Only changes-only storage (ORDER_STORAGE_MODE=changes) keeps these, and parsing issued is
+# most of the cost of decoding a page, so every other mode leaves them out of its batches
+DIFF_COLUMNS = ("issued", "duration")
+BASE_COLUMNS = tuple(name for name in ORDER_COLUMNS if name not in DIFF_COLUMNS)
+
+def decoded_columns(storage_mode):
+    return tuple(ORDER_COLUMNS) if storage_mode == "changes" else BASE_COLUMNS
+
+def decode_column(name, dtype, raw_entries):
+    values = map(itemgetter(name), raw_entries)
+    if name == "issued":
+        # ESI sends "2025-01-01T00:00:00Z"; numpy parses the naive part straight to seconds
+        return np.array([value[:19] for value in values], dtype="datetime64[s]").astype(np.int64)
+    return np.fromiter(values, dtype=dtype, count=len(raw_entries))
+
+class OrderBatch:
+    """A set of market orders held as one NumPy array per column. The DIFF_COLUMNS are
+    only there when they were asked for (see decoded_columns)."""
+
+    def __init__(self, **columns):
+        self.columns = tuple(name for name in ORDER_COLUMNS if name in columns)
+        for name in self.columns:
+            setattr(self, name, np.asarray(columns[name], dtype=ORDER_COLUMNS[name]))
+
+    @classmethod
+    def empty(cls, columns=tuple(ORDER_COLUMNS)):
+        return cls(**{name: np.empty(0, dtype=ORDER_COLUMNS[name]) for name in columns})
+
+    @classmethod
+    def from_raw(cls, raw_entries, location_id=None, columns=BASE_COLUMNS):
+        # Masking on the location column first, so only the kept orders are decoded
+        # into the remaining columns (one pass per column, straight into typed arrays)
+        if location_id is not None:
+            locations = np.fromiter(map(itemgetter("location_id"), raw_entries), dtype=np.int64, count=len(raw_entries))
+            raw_entries = [raw_entries[i] for i in np.flatnonzero(locations == location_id).tolist()]
+        if not raw_entries:
+            return cls.empty(columns)
+        return cls(**{name: decode_column(name, ORDER_COLUMNS[name], raw_entries) for name in columns})
+
+    @classmethod
+    def from_columns(cls, columns):
+        return cls(**{name: columns[name] for name in ORDER_COLUMNS if name in columns})
+
+    @classmethod
+    def concat(cls, batches):
+        batches = list(batches)
+        if not batches:
+            return cls.empty()
+        # Only the columns every batch has
+        names = [name for name in batches[0].columns if all(name in batch.columns for batch in batches)]
+        return cls(**{name: np.concatenate([getattr(batch, name) for batch in batches]) for name in names})
+
+    def __len__(self):
+        return len(self.type_id)
+
+    def to_columns(self):
+        return {name: getattr(self, name).tolist() for name in self.columns}
+
+    def select(self, mask):
+        return OrderBatch(**{name: getattr(self, name)[mask] for name in self.columns})
+
+    def at_location(self, location_id):
+        return self.select(self.location_id == location_id)
+
+    def with_type_ids(self, type_ids):
+        return self.select(np.isin(self.type_id, np.fromiter(type_ids, dtype=np.int64)))
+
+    def unique_orders(self):
+        # The book shifts while pages are fetched, so an order can show up on two pages.
+        # Keeping its first appearance, in the original order.
+        _, first = np.unique(self.order_id, return_index=True)
+        if len(first) == len(self):
+            return self
+        return self.select(np.sort(first))
+
+    def order_rows(self, fetched_time):
+        # Row tuples in market_orders column order, converted to plain Python scalars for sqlite
+        return zip(
+            repeat(fetched_time),
+            self.type_id.tolist(),
+            self.volume_remain.tolist(),
+            self.price.tolist(),
+            self.is_buy_order.tolist(),
+        )
+
+    def clustered_rows(self, fetched_time):
+        # Row tuples for the clustered market_orders layout, which keys rows by order id
+        return zip(
+            repeat(fetched_time),
+            self.type_id.tolist(),
+            self.order_id.tolist(),
+            self.volume_remain.tolist(),
+            self.price.tolist(),
+            self.is_buy_order.tolist(),
+        )
+
+    def book_rows(self):
+        # Row tuples in open_orders / staged order column order
+        if any(name not in self.columns for name in DIFF_COLUMNS):
+            raise ValueError("Orders were decoded without issued and duration, which changes-only storage needs")
+        return zip(
+            self.order_id.tolist(),
+            self.type_id.tolist(),
+            self.volume_remain.tolist(),
+            self.price.tolist(),
+            self.is_buy_order.tolist(),
+            self.location_id.tolist(),
+            self.issued.tolist(),
+            self.duration.tolist(),
+        )
+
+    def price_rows(self, fetched_time):
+        # Row tuples in mineral_prices column order
+        return zip(repeat(fetched_time), self.type_id.tolist(), self.price.tolist())
+
+# Column name -> dtype for the per-type aggregates of a snapshot (type_snapshots)
+SUMMARY_COLUMNS = {
+    "type_id": np.int64,
+    "min_sell": np.float64,
+    "max_buy": np.float64,
+    "sell_volume": np.int64,
+    "buy_volume": np.int64,
+    "sell_orders": np.int64,
+    "buy_orders": np.int64,
+}
+
+class TypeSummary:
+    """One row per type_id: best prices, total volume and order counts on each side.
+
+    Summaries of separate batches merge into the summary of their union, so the write
+    stage can summarise each batch as it goes and combine them once at the end."""
+
+    def __init__(self, **columns):
+        for name, dtype in SUMMARY_COLUMNS.items():
+            setattr(self, name, np.asarray(columns[name], dtype=dtype))
+
+    @classmethod
+    def from_batch(cls, batch):
+        # Missing sides are +/-inf so they never win the min/max, and become NULL in the table
+        sell = ~batch.is_buy_order
+        return cls.reduce(
+            type_id=batch.type_id,
+            min_sell=np.where(sell, batch.price, np.inf),
+            max_buy=np.where(sell, -np.inf, batch.price),
+            sell_volume=np.where(sell, batch.volume_remain, 0),
+            buy_volume=np.where(sell, 0, batch.volume_remain),
+            sell_orders=sell,
+            buy_orders=~sell,
+        )
+
+    @classmethod
+    def from_sell_prices(cls, prices):
+        # prices is [(type_id, price)], each one more sell order with no volume (the ore values)
+        type_ids = [type_id for type_id, _ in prices]
+        return cls.reduce(
+            type_id=type_ids,
+            min_sell=[price for _, price in prices],
+            max_buy=np.full(len(prices), -np.inf),
+            sell_volume=np.zeros(len(prices)),
+            buy_volume=np.zeros(len(prices)),
+            sell_orders=np.ones(len(prices)),
+            buy_orders=np.zeros(len(prices)),
+        )
+
+    @classmethod
+    def merge(cls, summaries):
+        summaries = list(summaries)
+        return cls.reduce(**{name: np.concatenate([getattr(s, name) for s in summaries] or [np.empty(0)]) for name in SUMMARY_COLUMNS})
+
+    @classmethod
+    def reduce(cls, **columns):
+        type_ids = np.asarray(columns["type_id"], dtype=np.int64)
+        if len(type_ids) == 0:
+            return cls(**{name: np.empty(0, dtype=dtype) for name, dtype in SUMMARY_COLUMNS.items()})
+
+        # Sorting by type so each type is one contiguous run, then reducing every run at once
+        order = np.argsort(type_ids, kind="stable")
+        type_ids = type_ids[order]
+        starts = np.flatnonzero(np.r_[True, type_ids[1:] != type_ids[:-1]])
+
+        def reduce_column(name, ufunc):
+            return ufunc.reduceat(np.asarray(columns[name], dtype=SUMMARY_COLUMNS[name])[order], starts)
+
+        return cls(
+            type_id=type_ids[starts],
+            min_sell=reduce_column("min_sell", np.minimum),
+            max_buy=reduce_column("max_buy", np.maximum),
+            sell_volume=reduce_column("sell_volume", np.add),
+            buy_volume=reduce_column("buy_volume", np.add),
+            sell_orders=reduce_column("sell_orders", np.add),
+            buy_orders=reduce_column("buy_orders", np.add),
+        )
+
+    def __len__(self):
+        return len(self.type_id)
+
+    def rollup_rows(self, fetched_time, seconds):
+        # Row tuples for a price rollup table of this resolution, for every type with a sell side
+        sell = ~np.isinf(self.min_sell)
+        return zip(
+            self.type_id[sell].tolist(),
+            repeat(fetched_time - fetched_time % seconds),
+            self.min_sell[sell].tolist(),
+            self.sell_volume[sell].tolist(),
+            repeat(fetched_time),
+        )
+
+    def snapshot_rows(self, fetched_time):
+        # Row tuples in type_snapshots column order; an empty side becomes NaN, which sqlite stores as NULL
+        return zip(
+            repeat(fetched_time),
+            self.type_id.tolist(),
+            np.where(np.isinf(self.min_sell), np.nan, self.min_sell).tolist(),
+            np.where(np.isinf(self.max_buy), np.nan, self.max_buy).tolist(),
+            self.sell_volume.tolist(),
+            self.buy_volume.tolist(),
+            self.sell_orders.tolist(),
+            self.buy_orders.tolist(),
+        )
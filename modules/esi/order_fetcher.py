@@ -0,0 +1,125 @@
+import os
+from datetime import UTC
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+from modules.utils.logging_setup import get_logger
+from modules.esi.page_cache import save_cached_page
+from modules.esi.order_batch import OrderBatch, BASE_COLUMNS
+from modules.esi.esi_client import USER_AGENT
+
+log = get_logger("OrderFetcher")
+
+load_dotenv()
+ESI_BASE_URL = os.getenv("ESI_BASE_URL", "https://esi.evetech.net")
+ESI_FETCH_CONCURRENCY = int(os.getenv("ESI_FETCH_CONCURRENCY", 1))
+ESI_PAGE_RETRIES = int(os.getenv("ESI_PAGE_RETRIES", 3))
+OVERRIDE_MAX_ESI_PAGES = int(os.getenv("OVERRIDE_MAX_ESI_PAGES", 0))
+
+jita_region_id = 10000002 # The Forge
+plex_region_id = 19000001 # Global PLEX Market
+jita_hub_station_id = 60003760 # Jita 4-4
+gsf_structure_id = 1049588174021 # C-J Keepstar
+
+class ESISessionError(Exception):
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors
+
+
+def build_orders_url(market, page, base_url=ESI_BASE_URL):
+    if market == "gsf":
+        return f"{base_url}/markets/structures/{gsf_structure_id}?page={page}"
+    elif market == "jita":
+        return f"{base_url}/latest/markets/{jita_region_id}/orders/?order_type=all&page={page}"
+    elif market == "plex":
+        return f"{base_url}/latest/markets/{plex_region_id}/orders/?order_type=all&page={page}"
+    else:
+        raise ValueError(f"Market {market} not recognized")
+
+def build_headers(token):
+    return {
+        "Authorization": f'Bearer {token["access_token"]}',
+        "Content-Type": "application/json",
+        "User-Agent": USER_AGENT,
+    }
+
+def filter_orders(raw_entries, market, columns=BASE_COLUMNS):
+    # Decoding the page into columns, keeping only Jita 4-4 orders for regional markets
+    if market == "gsf":
+        return OrderBatch.from_raw(raw_entries, columns=columns)
+    return OrderBatch.from_raw(raw_entries, location_id=jita_hub_station_id, columns=columns)
+
+def parse_expires(headers):
+    expires_header = headers.get("expires")
+    if not expires_header:
+        return 0
+    expires_dt = parsedate_to_datetime(expires_header)
+    if expires_dt.tzinfo is None:
+        expires_dt = expires_dt.replace(tzinfo=UTC)
+    return expires_dt.timestamp()
+
+async def request_page(session, token, market, page, cached=None, base_url=ESI_BASE_URL):
+    url = build_orders_url(market, page, base_url)
+    request_headers = build_headers(token)
+    if cached and cached.get("etag"):
+        request_headers["If-None-Match"] = cached["etag"]
+
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            # The client takes care of the governor and the error budget
+            response = await session.get(url, headers=request_headers)
+            log.debug(f"Response code from {market} page {page}: {response.status}")
+
+            # If Token is expire, malformed, or otherwise invalid
+            if response.status == 401:
+                log.error(f"Recieved 401 response, token is invalid")
+                raise ESISessionError(f"ESI Token Invalid, on page {page}", errors=page)
+
+            result = {
+                "page": page,
+                "etag": response.headers.get("ETag"),
+                "expires": parse_expires(response.headers),
+                "raw": None,
+                "cached": cached,
+                "status": response.status,
+                "bytes": len(response.body),
+                "errors": attempts - 1,
+            }
+
+            # 200 OK - new data, handed back unfiltered
+            if response.status == 200:
+                result["raw"] = response.json()
+                result["pages"] = int(response.headers.get("X-Pages", 1))
+                return result
+
+            # 304 Not Modified - the orders filtered on an earlier run are still current
+            if response.status == 304 and cached:
+                log.debug(f"Received 304 for {market} page {page}, using cached orders")
+                result["etag"] = result["etag"] or cached["etag"]
+                result["pages"] = int(response.headers.get("X-Pages", cached["pages"]))
+                return result
+
+            log.error(f"Received unhandled response code {response.status} when fetching {market} orders on page {page}")
+            raise Exception(f"Unhandled response code: {response.status}")
+
+        except ESISessionError:
+            raise
+
+        # Counting errors to ensure I don't anger the ESI gods
+        except Exception as e:
+            log.error(f"Error fetching {market} orders on page {page} (attempt {attempts}): {e}")
+            if attempts >= ESI_PAGE_RETRIES:
+                raise
+
+async def resolve_page(result, market, use_cache=True, columns=BASE_COLUMNS):
+    # Filtering fresh pages (and caching the result), or reusing the cached orders on a 304
+    if result["raw"] is not None:
+        orders = filter_orders(result["raw"], market, columns)
+    else:
+        orders = result["cached"]["orders"]
+    # Pages served straight from the cache are already saved as-is
+    if use_cache and not result.get("from_cache"):
+        await save_cached_page(market, result["page"], result["etag"], result["expires"], result["pages"], orders)
+    return orders
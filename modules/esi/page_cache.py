@@ -0,0 +1,55 @@
+import json
+import os
+from datetime import datetime, UTC
+import aiofiles
+from modules.utils.paths import PAGE_CACHE_DIR
+from modules.utils.logging_setup import get_logger
+from modules.esi.order_batch import OrderBatch, BASE_COLUMNS
+
+log = get_logger("PageCache")
+
+def cached_page_path(market, page, cache_dir=PAGE_CACHE_DIR):
+    return cache_dir / market / f"page_{page}.json"
+
+async def load_cached_page(market, page, cache_dir=PAGE_CACHE_DIR, columns=BASE_COLUMNS):
+    path = cached_page_path(market, page, cache_dir)
+    if not path.exists():
+        return None
+
+    try:
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            entry = json.loads(await f.read())
+        # Entries written before a column was added to OrderBatch, or by a storage mode that
+        # did not decode every column this one needs, can't be reused
+        missing = set(columns) - entry["orders"].keys()
+        if missing:
+            log.debug(f"Cache entry for {market} page {page} is missing columns {sorted(missing)}, refetching")
+            return None
+        entry["orders"] = OrderBatch.from_columns({name: entry["orders"][name] for name in columns})
+        return entry
+    except Exception as e:
+        log.warning(f"Discarding unreadable cache entry for {market} page {page}: {e}")
+        return None
+
+async def save_cached_page(market, page, etag, expires, pages, orders, cache_dir=PAGE_CACHE_DIR):
+    path = cached_page_path(market, page, cache_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Orders are kept column-wise so a cached Forge page is a handful of short lists
+    # rather than a thousand repeated dict keys.
+    entry = {
+        "etag": etag,
+        "expires": expires,
+        "pages": pages,
+        "orders": orders.to_columns(),
+    }
+
+    # Writing to a temp file first so a crash never leaves a half-written entry behind
+    tmp_path = path.with_suffix(".tmp")
+    async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+        await f.write(json.dumps(entry, separators=(",", ":")))
+    os.replace(tmp_path, path)
+    log.debug(f"Cached {len(orders)} orders for {market} page {page} (ETag {etag})")
+
+def is_fresh(entry):
+    # ESI will not publish a new version of the page before its Expires time
+    return entry is not None and entry.get("expires", 0) > datetime.now(UTC).timestamp()
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import gzip
+import json
+import sys
+import time as t
+from datetime import datetime, UTC
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+from multidict import CIMultiDict
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.utils.paths import RECORDINGS_DIR
+from modules.utils.logging_setup import get_logger
+from modules.esi.esi_client import ESIResponse
+
+log = get_logger("PageRecorder")
+
+# Headers the ingest pipeline reads; everything else is left out of recordings
+RECORDED_HEADERS = ("X-Pages", "ETag", "Expires")
+
+# Recordings are laid out as RECORDINGS_DIR/<market>/<UTC stamp>/page_N.json.gz,
+# with a recording.json next to the pages saying which market and when.
+
+def new_recording_dir(market, recordings_dir=RECORDINGS_DIR):
+    return recordings_dir / market / datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+
+def page_number(url):
+    return int(parse_qs(urlsplit(url).query).get("page", ["1"])[0])
+
+def recorded_page_path(directory, page):
+    return directory / f"page_{page}.json.gz"
+
+def load_recording_info(directory):
+    return json.loads((directory / "recording.json").read_text())
+
+class RecordingClient:
+    """Wraps an ESIClient and writes every 200 page it returns (body and headers) to disk.
+
+    Pages answered with 304 have no body to record, so recording runs should fetch
+    with use_cache=False."""
+
+    def __init__(self, client, market, directory=None):
+        self.client = client
+        self.market = market
+        self.directory = directory or new_recording_dir(market)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        info = {"market": market, "recorded_at": datetime.now(UTC).timestamp()}
+        (self.directory / "recording.json").write_text(json.dumps(info))
+        log.info(f"Recording {market} pages to {self.directory}")
+
+    async def get(self, url, headers=None, governed=True):
+        response = await self.client.get(url, headers=headers, governed=governed)
+        if response.status == 200:
+            page = page_number(url)
+            entry = {
+                "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+                "body": response.body.decode("utf-8"),
+            }
+            # Compressing in a worker thread; a Forge page is a few hundred KB of JSON
+            data = await asyncio.to_thread(gzip.compress, json.dumps(entry).encode("utf-8"), 6)
+            await asyncio.to_thread(recorded_page_path(self.directory, page).write_bytes, data)
+        return response
+
+class ReplayClient:
+    """Stands in for an ESIClient, serving a recording's pages from disk with no network
+    or rate limiting, so the same pull can be pushed through ingest again and again."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.info = load_recording_info(self.directory)
+        self.market = self.info["market"]
+        self.recorded_at = datetime.fromtimestamp(self.info["recorded_at"], UTC)
+        self._pages = {}
+
+    def preload(self):
+        # Reading every page up front, so timed replays measure ingest rather than gunzip
+        for path in self.directory.glob("page_*.json.gz"):
+            page = int(path.name.split("_")[1].split(".")[0])
+            self._pages[page] = self._read_page(page)
+        log.debug(f"Preloaded {len(self._pages)} recorded {self.market} pages")
+
+    def _read_page(self, page):
+        entry = json.loads(gzip.decompress(recorded_page_path(self.directory, page).read_bytes()))
+        return CIMultiDict(entry["headers"]), entry["body"].encode("utf-8")
+
+    async def get(self, url, headers=None, governed=True):
+        page = page_number(url)
+        if page not in self._pages:
+            if not recorded_page_path(self.directory, page).exists():
+                return ESIResponse(404, CIMultiDict(), b"")
+            self._pages[page] = await asyncio.to_thread(self._read_page, page)
+        page_headers, body = self._pages[page]
+        return ESIResponse(200, page_headers, body)
+
+async def replay_into_db(directory, database_path, concurrency, repeats, with_ore_values):
+    from modules.esi.ingest_pipeline import run_ingest_pipeline
+    from modules.esi.ingest_ledger import IngestRunStats, save_ingest_run
+    from modules.utils.ore_controller import load_ore_list
+    from modules.utils.init_db import init_db
+
+    await init_db(database_path)
+    client = ReplayClient(directory)
+    client.preload()
+    stage_minerals = client.market != "plex"
+    ore_list = await load_ore_list() if with_ore_values and stage_minerals else []
+
+    for run in range(repeats):
+        # Replays land in ingest_runs too, so stage timings can be compared across changes
+        stats = IngestRunStats(client.market)
+        start = t.perf_counter()
+        # Stamping rows with the original pull time so a rebuilt database matches the archive
+        orders_written, _, _ = await run_ingest_pipeline(
+            {"access_token": "replay"}, client.market, database_path, stage_minerals,
+            concurrency=concurrency, use_cache=False, session=client, fetched_time=client.recorded_at, stats=stats, ore_list=ore_list,
+        )
+        elapsed = t.perf_counter() - start
+        stats.finish()
+        await save_ingest_run(database_path, stats)
+        print(f"run {run + 1}: {orders_written} orders in {elapsed:.3f}s ({orders_written / elapsed:,.0f} orders/s), ore values {stats.ore_seconds:.3f}s")
+
+async def record_market(market, concurrency):
+    from modules.esi.ingest_pipeline import run_ingest_pipeline
+    from modules.esi.esi_client import get_esi_client, close_esi_client
+    from modules.esi.session_control import load_esi_token
+    from tempfile import TemporaryDirectory
+    from modules.utils.init_db import init_db
+
+    token = await load_esi_token()
+    client = RecordingClient(get_esi_client(), market)
+    # The pull itself goes into a throwaway database; only the recording is kept
+    with TemporaryDirectory() as tmp:
+        database_path = Path(tmp) / "recording.db"
+        await init_db(database_path)
+        await run_ingest_pipeline(token, market, database_path, stage_minerals=False, concurrency=concurrency, use_cache=False, session=client)
+    await close_esi_client()
+    print(f"Recorded {market} to {client.directory}")
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Record raw ESI market pages, or replay a recording into a database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Pull a market from ESI and save every page")
+    record_parser.add_argument("--market", choices=["jita", "gsf", "plex"], required=True)
+    record_parser.add_argument("--concurrency", type=int, default=8)
+
+    replay_parser = subparsers.add_parser("replay", help="Push a recording through ingest without the network")
+    replay_parser.add_argument("--recording", type=Path, required=True, help="Recording directory (contains recording.json)")
+    replay_parser.add_argument("--db_path", type=Path, required=True)
+    replay_parser.add_argument("--concurrency", type=int, default=8)
+    replay_parser.add_argument("--repeats", type=int, default=1, help="Replay the same pages this many times, for benchmarking")
+    replay_parser.add_argument("--ore_values", action="store_true", help="Also calculate and store ore values after each replay")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        asyncio.run(record_market(args.market, args.concurrency))
+    else:
+        asyncio.run(replay_into_db(args.recording, args.db_path, args.concurrency, args.repeats, args.ore_values))
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time as t
+from dotenv import load_dotenv
+from modules.utils.logging_setup import get_logger
+
+log = get_logger("ESIGovernor")
+
+load_dotenv()
+ESI_REQUESTS_PER_SECOND = float(os.getenv("ESI_REQUESTS_PER_SECOND", 20))
+ESI_REQUEST_BURST = int(os.getenv("ESI_REQUEST_BURST", 10))
+ESI_ERROR_FLOOR = int(os.getenv("ESI_ERROR_FLOOR", 10))
+
+class ESIGovernor:
+    """Process-wide gate in front of every ESI request: a token bucket for request
+    rate, plus the error budget ESI reports in X-ESI-Error-Limit-Remain."""
+
+    def __init__(self, rate=ESI_REQUESTS_PER_SECOND, burst=ESI_REQUEST_BURST, error_floor=ESI_ERROR_FLOOR):
+        self.rate = rate
+        self.burst = burst
+        self.error_floor = error_floor
+        self.tokens = burst
+        self.last_refill = t.monotonic()
+        self.errors_remaining = 100
+        self.resume_at = 0
+
+    def _refill(self):
+        now = t.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self):
+        # Waiting out any error-budget pause, then for a token from the bucket
+        while True:
+            pause = self.resume_at - t.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            if self.errors_remaining <= self.error_floor:
+                log.info("ESI error window reset, resuming requests")
+                self.errors_remaining = 100
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def observe(self, status, headers):
+        # ESI's own count is authoritative whenever it sends one
+        if "X-ESI-Error-Limit-Remain" in headers:
+            self.errors_remaining = int(headers["X-ESI-Error-Limit-Remain"])
+        elif status >= 400:
+            self.errors_remaining -= 1
+        reset = int(headers.get("X-ESI-Error-Limit-Reset", 60))
+        log.debug(f"ESI Allowed Errors Remaining: {self.errors_remaining} (window resets in {reset}s)")
+        self._check_budget(reset)
+
+    def record_error(self, reset=60):
+        # Requests that failed without a response still count against us conservatively
+        self.errors_remaining -= 1
+        self._check_budget(reset)
+
+    def _check_budget(self, reset):
+        # Every caller checks resume_at in acquire(), so this pauses all fetchers at once
+        if self.errors_remaining > self.error_floor or self.paused:
+            return
+        self.resume_at = t.time() + reset + 1
+        log.warning(f"ESI error budget down to {self.errors_remaining}, pausing all requests for {reset + 1} seconds")
+
+    @property
+    def paused(self):
+        return self.resume_at > t.time()
+
+esi_governor = ESIGovernor()
@@ -1,9 +1,10 @@
 from modules.utils.paths import TOKEN_FILE, RUNTIME_CACHE_PATH
 from modules.utils.logging_setup import get_logger
+from modules.esi.esi_client import get_esi_client
 from dotenv import load_dotenv
 import json
 import time as t
-import aiofiles, aiohttp
+import aiofiles
 import os
 from requests_oauthlib import OAuth2Session
 
@@ -61,16 +62,15 @@ async def get_esi_status():
         log.debug("Using Cached ESI Status")
         return cached_status
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get("https://esi.evetech.net/latest/status/", timeout=5) as response:
-                cached_status = await response.json()
-                last_esi_status_check_time = t.time()
-                return cached_status
-        except Exception as e:
-            log.error(f"Error fetching ESI status: {e}")
-            log.info(f"Due to error, returning cached status if available")
-            return cached_status
+    try:
+        response = await get_esi_client().get("https://esi.evetech.net/latest/status/")
+        cached_status = response.json()
+        last_esi_status_check_time = t.time()
+        return cached_status
+    except Exception as e:
+        log.error(f"Error fetching ESI status: {e}")
+        log.info(f"Due to error, returning cached status if available")
+        return cached_status
 
 async def get_authenticated_session():
     try:
@@ -0,0 +1,131 @@
+import os
+import time as t
+import aiosqlite
+from dotenv import load_dotenv
+from modules.utils.logging_setup import get_logger
+from modules.esi.order_batch import TypeSummary
+from modules.esi.data_control import (
+    insert_orders, insert_mineral_prices, insert_type_snapshots, insert_ore_orders,
+    begin_order_diff, stage_book_orders, apply_order_changes,
+    load_staged_mineral_prices, delete_mineral_prices, market_orders_clustered, update_rollups,
+)
+from modules.utils.ore_controller import calculate_ore_value
+
+log = get_logger("SnapshotWriter")
+
+load_dotenv()
+WRITER_CACHE_SIZE_KB = int(os.getenv("WRITER_CACHE_SIZE_KB", 64 * 1024))
+# After a checkpoint the WAL file is cut back to this, instead of staying at its high-water mark
+WAL_SIZE_LIMIT = int(os.getenv("WAL_SIZE_LIMIT", 64 * 1024 * 1024))
+
+WRITE_PRAGMAS = (
+    # In WAL mode NORMAL only risks the last commit on power loss, never corruption
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA cache_size = -{WRITER_CACHE_SIZE_KB}",
+    "PRAGMA temp_store = MEMORY",
+    # Checkpoints are run by the writer once a snapshot is committed (see checkpoint below)
+    "PRAGMA wal_autocheckpoint = 0",
+    f"PRAGMA journal_size_limit = {WAL_SIZE_LIMIT}",
+)
+
+class SnapshotWriter:
+    """Writes one market snapshot - orders, type summaries, price rollups, mineral
+    staging and ore values - on one connection, in one transaction.
+
+        async with SnapshotWriter(database_path, fetched_time, reprocess_ids=ids) as writer:
+            await writer.write_orders(batch)
+            ...
+            await writer.commit(ore_list)
+    """
+
+    def __init__(self, database_path, fetched_time, storage_mode="snapshot", reprocess_ids=(), db=None, stats=None):
+        self.database_path = database_path
+        self.fetched_time = fetched_time
+        self.storage_mode = storage_mode
+        self.reprocess_ids = reprocess_ids
+        self.db = db
+        self.own_connection = db is None
+        self.stats = stats
+        self.summaries = []
+        self.orders_written = 0
+
+    async def __aenter__(self):
+        if self.own_connection:
+            self.db = await aiosqlite.connect(self.database_path)
+        for pragma in WRITE_PRAGMAS:
+            await self.db.execute(pragma)
+        self.clustered = await market_orders_clustered(self.db)
+        if self.storage_mode == "changes":
+            await begin_order_diff(self.db)
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is not None:
+                # A persistent daemon connection must not carry a half-written snapshot into the next cycle
+                await self.db.rollback()
+        finally:
+            if self.own_connection:
+                await self.db.close()
+
+    def _add_seconds(self, field, start):
+        if self.stats is not None:
+            setattr(self.stats, field, getattr(self.stats, field) + t.perf_counter() - start)
+
+    async def write_orders(self, batch):
+        # Rows land as batches arrive, but readers see none of them until commit()
+        start = t.perf_counter()
+        self.summaries.append(TypeSummary.from_batch(batch))
+        if self.storage_mode == "changes":
+            await stage_book_orders(self.db, batch)
+        else:
+            await insert_orders(self.db, batch, self.fetched_time, self.clustered)
+        self._add_seconds("save_orders_seconds", start)
+
+        if self.reprocess_ids:
+            start = t.perf_counter()
+            await insert_mineral_prices(self.db, batch, self.fetched_time, self.reprocess_ids)
+            self._add_seconds("save_minerals_seconds", start)
+        self.orders_written += len(batch)
+
+    async def write_ore_values(self, ore_list):
+        # The staged mineral prices are read back on this connection, so they are visible
+        # here before they are committed; they are then cleared in the same transaction
+        start = t.perf_counter()
+        mineral_prices = await load_staged_mineral_prices(self.db, self.fetched_time)
+        ore_prices = []
+        for ore_id in ore_list:
+            # One ore that cannot be valued must not cost the whole market snapshot
+            try:
+                ore_prices.append((ore_id, await calculate_ore_value(ore_id, self.database_path, mineral_prices)))
+            except Exception as e:
+                log.warning(f"Skipping ore {ore_id}, it could not be valued: {e!r}")
+        await insert_ore_orders(self.db, ore_prices, self.fetched_time, self.clustered)
+        await delete_mineral_prices(self.db)
+        self._add_seconds("ore_seconds", start)
+        return ore_prices
+
+    async def commit(self, ore_list=()):
+        start = t.perf_counter()
+        # Type summaries first: they are INSERT OR REPLACE, and the ore values merge into them
+        summary = TypeSummary.merge(self.summaries)
+        await insert_type_snapshots(self.db, summary, self.fetched_time)
+        self._add_seconds("save_orders_seconds", start)
+        if self.reprocess_ids:
+            ore_prices = await self.write_ore_values(ore_list)
+            summary = TypeSummary.merge([summary, TypeSummary.from_sell_prices(ore_prices)])
+        start = t.perf_counter()
+        # The rollups come from the same in-memory summary, in the same transaction
+        await update_rollups(self.db, summary, self.fetched_time)
+        if self.storage_mode == "changes":
+            await apply_order_changes(self.db, self.fetched_time)
+        await self.db.commit()
+        self._add_seconds("save_orders_seconds", start)
+        await self.checkpoint()
+
+    async def checkpoint(self):
+        # PASSIVE copies what it can without waiting on anyone, so a reader holding an old
+        # snapshot is never blocked or starved; whatever it could not copy is picked up next time
+        async with self.db.execute("PRAGMA wal_checkpoint(PASSIVE)") as cursor:
+            busy, wal_pages, checkpointed = await cursor.fetchone()
+        log.debug(f"Checkpointed {checkpointed} of {wal_pages} WAL pages into {self.database_path}")
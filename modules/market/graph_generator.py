@@ -4,10 +4,7 @@ import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib as mpl
-from datetime import datetime, timedelta, UTC, timezone
 from dotenv import load_dotenv
-import aiosqlite
-from collections import defaultdict
 import sys
 from pathlib import Path
 import matplotlib.dates as mdates
@@ -19,6 +16,7 @@ if __name__ == "__main__":
 
 from modules.utils.logging_setup import get_logger
 from modules.utils.paths import GRAPHS_TEMP_DIR, ITEM_IDS_FILE, MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX
+from modules.esi.data_control import min_sell_by_time
 
 log = get_logger("GraphGenerator")
 
@@ -53,29 +51,8 @@ async def connect_to_db(type_id: int, days: int, market: str):
         MARKET_DB = MARKET_DB_FILE_JITA
         log.debug(f"Market file located at {MARKET_DB}")
 
-    async with aiosqlite.connect(MARKET_DB) as db:
-        db.row_factory = aiosqlite.Row
-
-        now_datetime = datetime.now(UTC)
-        time_delta = timedelta(days=days)
-
-        cutoff = (now_datetime - time_delta)
-        cutoff_str = cutoff.isoformat()
-
-        query = """
-            SELECT timestamp, type_id, price, is_buy_order
-            FROM market_orders
-            WHERE type_id = ?
-            AND is_buy_order = FALSE
-            AND timestamp >= ?
-            ORDER BY timestamp ASC
-        """
-        params = [type_id, cutoff_str]
-        log.debug(f"Query set, params set as {params}")
-
-        async with db.execute(query, tuple(params)) as cursor:
-            rows = await cursor.fetchall()
-            return rows
+    # [(timestamp, lowest sell)], already one per timestamp and oldest first
+    return await min_sell_by_time(type_id, MARKET_DB, days)
 
 async def match_item_name(type_id: int):
     matched_row = items_df[items_df["typeID"] == type_id]
@@ -86,23 +63,14 @@ async def match_item_name(type_id: int):
         return f"Unknown Item {type_id}"
 
 async def generate_graph(type_id, days, market, type_name):
-    sell_by_time = defaultdict(lambda: float('inf'))  # lowest sell wins
-
-
     rows = await connect_to_db(type_id, days, market)
 
-    for row in rows:
-        iso_ts = row["timestamp"]
-        ts = pd.to_datetime(iso_ts)
-        unix_timestamp = int(ts.timestamp())
-        sell_by_time[unix_timestamp] = min(sell_by_time[unix_timestamp], row["price"])
-
-    sell_times   = sorted(sell_by_time.keys())
-    sell_prices  = [sell_by_time[t] for t in sell_times]
+    sell_times   = [timestamp for timestamp, _ in rows]
+    sell_prices  = [price for _, price in rows]
 
-    sell_dt = [datetime.fromtimestamp(t, tz=timezone.utc) for t in sell_times]
+    sell_dt = pd.to_datetime(sell_times, unit="s", utc=True)
 
-    if sell_dt:
+    if len(sell_dt):
         oldest = sell_dt[0]
         most_recent = sell_dt[-1]
         delta = most_recent - oldest
@@ -166,31 +134,16 @@ async def generate_combined_graph(type_id, days, type_name):
     gsf_rows = await connect_to_db(type_id, days, "c-j6mt (gsf)")
     log.debug(f"Got gsf_rows, length is {len(gsf_rows)}")
 
-    jita_sell_by_time = defaultdict(lambda: float('inf'))  # lowest sell wins
-    gsf_sell_by_time = defaultdict(lambda: float('inf'))  # lowest sell wins
-
-    for row in jita_rows:
-        iso_ts = row["timestamp"]
-        ts = pd.to_datetime(iso_ts)
-        unix_timestamp = int(ts.timestamp())
-        jita_sell_by_time[unix_timestamp] = min(jita_sell_by_time[unix_timestamp], row["price"])
-
-    for row in gsf_rows:
-        iso_ts = row["timestamp"]
-        ts = pd.to_datetime(iso_ts)
-        unix_timestamp = int(ts.timestamp())
-        gsf_sell_by_time[unix_timestamp] = min(gsf_sell_by_time[unix_timestamp], row["price"])
-
-    jita_sell_times = sorted(jita_sell_by_time.keys())
-    jita_sell_prices  = [jita_sell_by_time[t] for t in jita_sell_times]
+    jita_sell_times = [timestamp for timestamp, _ in jita_rows]
+    jita_sell_prices  = [price for _, price in jita_rows]
 
-    gsf_sell_times = sorted(gsf_sell_by_time.keys())
-    gsf_sell_prices  = [gsf_sell_by_time[t] for t in gsf_sell_times]
+    gsf_sell_times = [timestamp for timestamp, _ in gsf_rows]
+    gsf_sell_prices  = [price for _, price in gsf_rows]
 
-    jita_sell_dt = [datetime.fromtimestamp(t, tz=timezone.utc) for t in jita_sell_times]
-    gsf_sell_dt = [datetime.fromtimestamp(t, tz=timezone.utc) for t in gsf_sell_times]
+    jita_sell_dt = pd.to_datetime(jita_sell_times, unit="s", utc=True)
+    gsf_sell_dt = pd.to_datetime(gsf_sell_times, unit="s", utc=True)
 
-    if jita_sell_dt:
+    if len(jita_sell_dt):
         oldest = jita_sell_dt[0]
         most_recent = jita_sell_dt[-1]
         delta = most_recent - oldest
@@ -199,7 +152,7 @@ async def generate_combined_graph(type_id, days, type_name):
     else:
         jita_display_days = 0
 
-    if gsf_sell_dt:
+    if len(gsf_sell_dt):
         oldest = gsf_sell_dt[0]
         most_recent = gsf_sell_dt[-1]
         delta = most_recent - oldest
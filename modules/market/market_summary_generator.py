@@ -3,7 +3,6 @@ import pandas as pd
 from pathlib import Path
 import sys
 import asyncio
-from collections import defaultdict
 from datetime import datetime, timezone
 
 if __name__ == "__main__":
@@ -38,8 +37,7 @@ async def create_summary(type_id: int, days: int, market: str, type_name: str):
         log.error("Error determining market database for '%s': %s. Defaulting to Jita.", market, e)
         MARKET_DB = MARKET_DB_FILE_JITA
 
-    sell_by_time = defaultdict(lambda: float('inf'))
-
+    # One row per day, grouped by the database (see data_control.lowest_price_per_day)
     rows = await lowest_price_per_day(type_id, MARKET_DB, days)
 
     if not rows:
@@ -48,13 +46,8 @@ async def create_summary(type_id: int, days: int, market: str, type_name: str):
 
     start_price = rows[-1]['lowest_price']
     end_price = rows[0]['lowest_price']
-    highest_price = float('-inf')
-    lowest_price = float('inf')
-
-    for row in rows:
-        price = row['lowest_price']
-        highest_price = max(highest_price, price)
-        lowest_price = min(lowest_price, price)
+    highest_price = max(row['lowest_price'] for row in rows)
+    lowest_price = min(row['lowest_price'] for row in rows)
 
     absolute_change = end_price - start_price
     percent_change = (absolute_change / start_price * 100)
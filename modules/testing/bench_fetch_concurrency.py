@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time as t
+from email.utils import format_datetime
+from datetime import datetime, timedelta, UTC
+from pathlib import Path
+from aiohttp import web
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.esi.order_fetcher import jita_hub_station_id
+from modules.esi.ingest_pipeline import run_ingest_pipeline
+from modules.esi.ingest_ledger import IngestRunStats
+from modules.esi.rate_governor import esi_governor
+from modules.esi.esi_client import ESIClient
+from modules.utils.init_db import init_db
+
+# Stand-in for the ESI regional orders endpoint. Each page is rendered once with its
+# own order_ids, then served after an artificial delay to mimic the round trip to ESI.
+def build_page_body(orders_per_page, page=1):
+    orders = []
+    for i in range(orders_per_page):
+        orders.append({
+            "duration": 90,
+            "is_buy_order": random.random() < 0.4,
+            "issued": "2025-01-01T00:00:00Z",
+            "location_id": jita_hub_station_id if random.random() < 0.3 else 60008494,
+            "min_volume": 1,
+            "order_id": 6000000000 + (page - 1) * orders_per_page + i,
+            "price": round(random.uniform(1, 1_000_000), 2),
+            "range": "region",
+            "system_id": 30000142,
+            "type_id": random.randint(18, 60000),
+            "volume_remain": random.randint(1, 10_000),
+            "volume_total": 10_000,
+        })
+    return json.dumps(orders).encode("utf-8")
+
+async def start_stand_in_server(pages, orders_per_page, latency_ms, port):
+    bodies = {}
+
+    async def orders_handler(request):
+        await asyncio.sleep(latency_ms / 1000)
+        page = int(request.query.get("page", 1))
+        if page not in bodies:
+            bodies[page] = build_page_body(orders_per_page, page)
+        expires = datetime.now(UTC) + timedelta(minutes=5)
+        etag = f'"{request.query.get("page", "1")}"'
+        headers = {
+            "X-Pages": str(pages),
+            "Expires": format_datetime(expires, usegmt=True),
+            "ETag": etag,
+            "X-ESI-Error-Limit-Remain": "100",
+            "X-ESI-Error-Limit-Reset": "60",
+        }
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=bodies[page], content_type="application/json", headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/latest/markets/{region_id}/orders/", orders_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    return runner
+
+async def main():
+    runner = await start_stand_in_server(args.pages, args.orders_per_page, args.latency_ms, args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    token = {"access_token": "benchmark"}
+
+    # The stand-in server has no rate limit, so the governor only applies when asked for
+    if args.rate_limit:
+        esi_governor.rate = args.rate_limit
+    else:
+        esi_governor.rate = 1e9
+        esi_governor.burst = max(args.concurrency)
+
+    print(f"{args.pages} pages x {args.orders_per_page} orders, {args.latency_ms}ms simulated latency")
+    # Each run is a full ingest, as the daemon does it, into a scratch database; "fetch" is
+    # the fetch stage's share of that (see IngestRunStats.fetch_seconds)
+    print(f"{'client':>8} {'concurrency':>12} {'seconds':>10} {'fetch':>10} {'pages/s':>10} {'orders kept':>12}")
+    scratch = tempfile.TemporaryDirectory()
+    database_path = Path(scratch.name) / "bench_market_prices.db"
+    await init_db(database_path)
+    try:
+        for http2 in (client == "httpx" for client in args.clients):
+            # Sizing the pool for the widest run so the pool itself never caps concurrency.
+            # The stand-in server is plain HTTP/1.1, so httpx talks HTTP/1.1 to it too: this
+            # compares the two client code paths, not the protocols.
+            client = ESIClient(pool_size=max(args.concurrency), http2=http2)
+            if http2 and not client.http2:
+                print("httpx is not installed, skipping it")
+                await client.close()
+                continue
+            try:
+                for concurrency in args.concurrency:
+                    stats = IngestRunStats("jita")
+                    start = t.perf_counter()
+                    orders_written, _, _ = await run_ingest_pipeline(token, "jita", database_path, stage_minerals=False, concurrency=concurrency, base_url=base_url, use_cache=False, session=client, stats=stats)
+                    elapsed = t.perf_counter() - start
+                    print(f"{'httpx' if http2 else 'aiohttp':>8} {concurrency:>12} {elapsed:>10.2f} {stats.fetch_seconds:>10.2f} {args.pages / elapsed:>10.1f} {orders_written:>12}")
+            finally:
+                await client.close()
+    finally:
+        await runner.cleanup()
+        scratch.cleanup()
+    return 0
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Benchmark the ingest pipeline's concurrent ESI page fetching against a local stand-in server.")
+    parser.add_argument("--pages", type=int, default=300, help="Number of pages the stand-in server reports in X-Pages")
+    parser.add_argument("--orders_per_page", type=int, default=1000, help="Orders in each page body (ESI serves 1000)")
+    parser.add_argument("--latency_ms", type=float, default=150, help="Simulated ESI response time per page")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", nargs="+", choices=["aiohttp", "httpx"], default=["aiohttp", "httpx"], help="ESIClient back ends to run: aiohttp (HTTP/1.1) and/or httpx (ESI_HTTP2=True)")
+    parser.add_argument("--rate_limit", type=float, default=0, help="Requests per second allowed by the ESI governor (0 = unlimited)")
+    args = parser.parse_args()
+
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+import argparse
+import json
+import random
+import sys
+import time as t
+from datetime import datetime, UTC
+from pathlib import Path
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.esi.order_batch import OrderBatch
+from modules.esi.order_fetcher import jita_hub_station_id
+from modules.utils.paths import REPROCESS_IDS
+
+def build_pages(pages, orders_per_page, reprocess_ids):
+    raw_pages = []
+    for page in range(pages):
+        orders = []
+        for i in range(orders_per_page):
+            orders.append({
+                "duration": 90,
+                "is_buy_order": random.random() < 0.4,
+                "issued": "2025-01-01T00:00:00Z",
+                "location_id": jita_hub_station_id if random.random() < 0.3 else 60008494,
+                "min_volume": 1,
+                "order_id": 6000000000 + page * orders_per_page + i,
+                "price": round(random.uniform(1, 1_000_000), 2),
+                "range": "region",
+                "system_id": 30000142,
+                "type_id": random.choice(reprocess_ids) if random.random() < 0.05 else random.randint(18, 60000),
+                "volume_remain": random.randint(1, 10_000),
+                "volume_total": 10_000,
+            })
+        # Round-tripping through JSON so both paths see pages shaped like a decoded response
+        raw_pages.append(json.loads(json.dumps(orders)))
+    return raw_pages
+
+# The dict path as it was before OrderBatch: filter into dicts, then a tuple per
+# row for market_orders, then another tuple per row for mineral_prices.
+def dict_path(raw_pages, fetched_time, reprocess_ids):
+    orders = []
+    for page in raw_pages:
+        for order in page:
+            if order.get("location_id") == jita_hub_station_id:
+                orders.append({
+                    "type_id": order.get("type_id"),
+                    "volume_remain": order.get("volume_remain"),
+                    "price": order.get("price"),
+                    "is_buy_order": order.get("is_buy_order"),
+                })
+    order_rows = [(fetched_time, o["type_id"], o["volume_remain"], o["price"], o["is_buy_order"]) for o in orders]
+    mineral_rows = [(fetched_time, o["type_id"], o["price"]) for o in orders if o["type_id"] in reprocess_ids]
+    return len(order_rows), len(mineral_rows)
+
+def columnar_path(raw_pages, fetched_time, reprocess_ids):
+    batch = OrderBatch.concat(OrderBatch.from_raw(page, location_id=jita_hub_station_id) for page in raw_pages)
+    order_rows = list(batch.order_rows(fetched_time))
+    mineral_rows = list(batch.with_type_ids(reprocess_ids).price_rows(fetched_time))
+    return len(order_rows), len(mineral_rows)
+
+def time_path(path, raw_pages, fetched_time, reprocess_ids, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = t.perf_counter()
+        counts = path(raw_pages, fetched_time, reprocess_ids)
+        best = min(best, t.perf_counter() - start)
+    return best, counts
+
+def main():
+    reprocess_ids = json.loads(REPROCESS_IDS.read_text())
+    raw_pages = build_pages(args.pages, args.orders_per_page, reprocess_ids)
+    fetched_time = datetime.now(UTC)
+    total = args.pages * args.orders_per_page
+
+    # JSON decoding is the same work on both paths, so it is left out of the timings
+    print(f"{args.pages} pages x {args.orders_per_page} orders ({total:,} orders), best of {args.repeats}")
+    print(f"{'path':>10} {'seconds':>10} {'orders/s':>14} {'kept':>8} {'minerals':>9}")
+    for name, path in (("dict", dict_path), ("columnar", columnar_path)):
+        elapsed, (kept, minerals) = time_path(path, raw_pages, fetched_time, set(reprocess_ids), args.repeats)
+        print(f"{name:>10} {elapsed:>10.3f} {total / elapsed:>14,.0f} {kept:>8} {minerals:>9}")
+    return 0
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Compare the dict and columnar order decoding paths.")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--orders_per_page", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time as t
+from pathlib import Path
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.esi.order_batch import OrderBatch
+from modules.esi.data_control import save_orders, save_mineral_price, save_ore_orders, clear_mineral_table
+from modules.esi.snapshot_writer import SnapshotWriter
+from modules.esi.ingest_pipeline import INGEST_BATCH_SIZE
+from modules.testing.bench_order_decode import build_pages
+from modules.utils.init_db import init_db
+from modules.utils.ore_controller import calculate_ore_value
+from modules.utils.paths import ORE_LIST, REPROCESS_IDS
+
+# Each path writes the same snapshots into its own fresh database; a snapshot is the
+# orders, the staged mineral orders and one value per ore.
+
+async def per_call_path(database_path, batch, fetched_time, reprocess_ids, ore_list):
+    # As market_requestor wrote a snapshot before SnapshotWriter: a connection and a commit
+    # per call, and two of each per ore
+    await save_orders(database_path, batch, fetched_time)
+    await save_mineral_price(database_path, batch, fetched_time)
+    for ore_id in ore_list:
+        ore_price = await calculate_ore_value(ore_id, database_path)
+        await save_ore_orders(database_path, ore_price, fetched_time, ore_id)
+    await clear_mineral_table(database_path)
+
+async def writer_path(database_path, batch, fetched_time, reprocess_ids, ore_list):
+    async with SnapshotWriter(database_path, fetched_time, reprocess_ids=reprocess_ids) as writer:
+        for start in range(0, len(batch), INGEST_BATCH_SIZE):
+            await writer.write_orders(batch.select(slice(start, start + INGEST_BATCH_SIZE)))
+        await writer.commit(ore_list)
+
+async def time_path(path, database_path, batch, reprocess_ids, ore_list, snapshots):
+    await init_db(database_path)
+    fetched_time = int(t.time())
+    timings = []
+    for snapshot in range(snapshots):
+        start = t.perf_counter()
+        await path(database_path, batch, fetched_time + snapshot * 300, reprocess_ids, ore_list)
+        timings.append(t.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+async def main():
+    reprocess_ids = json.loads(REPROCESS_IDS.read_text())
+    ore_list = json.loads(ORE_LIST.read_text())
+    batch = OrderBatch.concat(OrderBatch.from_raw(page) for page in build_pages(args.pages, args.orders_per_page, reprocess_ids)).unique_orders()
+    mineral_rows = len(batch.with_type_ids(set(reprocess_ids)))
+    rows = len(batch) + mineral_rows + len(ore_list)
+
+    print(f"{len(batch):,} orders + {mineral_rows:,} mineral rows + {len(ore_list)} ore values per snapshot, {args.snapshots} snapshots per path")
+    print(f"{'path':>10} {'best s':>9} {'mean s':>9} {'rows/s':>12}")
+    with tempfile.TemporaryDirectory(dir=args.db_dir) as tmp:
+        for name, path in (("per-call", per_call_path), ("writer", writer_path)):
+            best, mean = await time_path(path, Path(tmp) / f"{name}.db", batch, set(reprocess_ids), ore_list, args.snapshots)
+            print(f"{name:>10} {best:>9.3f} {mean:>9.3f} {rows / mean:>12,.0f}")
+    return 0
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Compare writing a snapshot call by call against SnapshotWriter.")
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--orders_per_page", type=int, default=1000)
+    parser.add_argument("--snapshots", type=int, default=5)
+    parser.add_argument("--db_dir", type=Path, help="Where the scratch databases go (default: the system temp dir); use the data disk for realistic fsync costs")
+    args = parser.parse_args()
+
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.utils.init_db import init_db
+from modules.esi.data_control import backfill_type_snapshots
+from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+from modules.utils.db_partitions import partition_paths
+
+async def main():
+    db_paths = [args.db_path] if args.db_path else [path for base_path in (MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX) for path in partition_paths(base_path)]
+    for db_path in db_paths:
+        if not Path(db_path).exists():
+            print(f"Skipping {db_path}, it does not exist")
+            continue
+        print(f"Backfilling type snapshots in {db_path}...")
+        await init_db(db_path)
+        inserted = await backfill_type_snapshots(db_path)
+        print(f"Added {inserted} rows")
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Build type_snapshots rows for snapshots stored before the table existed. init_db does this once per file (schema migration 7); this runs it again by hand.")
+    parser.add_argument("--db_path", type=Path, help="A single market database file (default: every partition of every market)")
+    args = parser.parse_args()
+
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import sys
+import time as t
+from pathlib import Path
+import aiosqlite
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.utils.logging_setup import get_logger
+from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+from modules.utils.db_partitions import partition_paths
+from modules.utils.init_db import init_db, market_orders_sql
+from modules.esi.data_control import market_orders_clustered
+
+log = get_logger("ClusterMarketOrders")
+
+# === Heap to clustered market_orders ===
+# The rows are copied type by type, in (type_id, timestamp) order, into a WITHOUT ROWID
+# table keyed on (type_id, timestamp, order_id), which is then renamed over the old one.
+# Heap rows have no order id, so each gets minus its old rowid: unique, and never an ESI id.
+# Timestamps still stored as text are converted on the way (see migrate_timestamps.py).
+COPY_SQL = """
+    INSERT INTO market_orders_clustered (timestamp, type_id, order_id, volume_remain, price, is_buy_order)
+    SELECT
+        CASE WHEN typeof(timestamp) = 'text' THEN CAST(strftime('%s', timestamp) AS INTEGER) ELSE timestamp END,
+        type_id,
+        -rowid,
+        volume_remain,
+        price,
+        is_buy_order
+    FROM market_orders
+    WHERE type_id BETWEEN ? AND ?
+    ORDER BY type_id, timestamp, rowid DESC
+"""
+
+async def type_chunks(db, start_type, chunk_size):
+    # [(first type_id, last type_id)] covering about chunk_size rows each, one type at least
+    async with db.execute("SELECT type_id, COUNT(*) FROM market_orders WHERE type_id >= ? GROUP BY type_id", (start_type,)) as cursor:
+        counts = await cursor.fetchall()
+    chunks = []
+    first, rows = None, 0
+    for type_id, count in counts:
+        if first is None:
+            first = type_id
+        rows += count
+        if rows >= chunk_size:
+            chunks.append((first, type_id))
+            first, rows = None, 0
+    if first is not None:
+        chunks.append((first, counts[-1][0]))
+    return chunks
+
+async def cluster_database(db_path, chunk_size, vacuum):
+    await init_db(db_path)
+    async with aiosqlite.connect(db_path, timeout=600) as db:
+        if await market_orders_clustered(db):
+            log.info(f"market_orders in {db_path} is already clustered")
+            return False
+
+        log.info(f"Clustering market_orders in {db_path}")
+        await db.execute(market_orders_sql(True, "market_orders_clustered"))
+        await db.commit()
+
+        # Resuming an interrupted run: the last type copied may be incomplete, so it is redone
+        async with db.execute("SELECT MAX(type_id) FROM market_orders_clustered") as cursor:
+            (resume_type,) = await cursor.fetchone()
+        if resume_type is not None:
+            log.info(f"Resuming from type {resume_type}")
+            await db.execute("DELETE FROM market_orders_clustered WHERE type_id = ?", (resume_type,))
+            await db.commit()
+
+        # One transaction per chunk keeps the WAL small on multi-GB files
+        chunks = await type_chunks(db, resume_type or 0, chunk_size)
+        start = t.perf_counter()
+        copied = 0
+        for number, (first_type, last_type) in enumerate(chunks, start=1):
+            async with db.execute(COPY_SQL, (first_type, last_type)) as cursor:
+                copied += cursor.rowcount
+            await db.commit()
+            log.debug(f"Chunk {number}/{len(chunks)}: types {first_type}-{last_type}, {copied} rows copied")
+        log.info(f"Copied {copied} rows in {t.perf_counter() - start:.1f}s")
+
+        # The swap is one transaction, so readers see either the old table or the new one.
+        # The old table's indexes go with it; all but the type and time index (which the
+        # clustered table is itself) are rebuilt on the new one.
+        async with db.execute("""
+            SELECT sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = 'market_orders' AND sql IS NOT NULL
+            AND name != 'idx_market_orders_type_timestamp_price'
+        """) as cursor:
+            index_sql = [row[0] for row in await cursor.fetchall()]
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            await db.execute("DROP TABLE market_orders")
+            await db.execute("ALTER TABLE market_orders_clustered RENAME TO market_orders")
+            for statement in index_sql:
+                await db.execute(statement)
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.execute("PRAGMA optimize")
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+    # The old heap's pages are left free inside the file until a VACUUM
+    if vacuum:
+        log.info(f"Vacuuming {db_path}")
+        async with aiosqlite.connect(db_path, timeout=600) as db:
+            await db.execute("VACUUM")
+    return True
+
+async def main():
+    db_paths = [args.db_path] if args.db_path else [path for base_path in (MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX) for path in partition_paths(base_path)]
+    for db_path in db_paths:
+        if not Path(db_path).exists():
+            print(f"Skipping {db_path}, it does not exist")
+            continue
+        size = Path(db_path).stat().st_size
+        converted = await cluster_database(db_path, args.chunk_size, args.vacuum)
+        if converted:
+            print(f"{db_path}: {size / 1024 / 1024:.1f} MB -> {Path(db_path).stat().st_size / 1024 / 1024:.1f} MB")
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Convert market_orders to the clustered WITHOUT ROWID layout, so each item's history is stored contiguously. Stop the ingester first; it is safe to interrupt and re-run. Set MARKET_ORDERS_LAYOUT=clustered for new partitions to start out clustered.")
+    parser.add_argument("--db_path", type=Path, help="A single market database file (default: every partition of every market)")
+    parser.add_argument("--chunk_size", type=int, default=500_000, help="Rows per transaction")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to give the old table's space back to the filesystem")
+    args = parser.parse_args()
+
+    asyncio.run(main())
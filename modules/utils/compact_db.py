@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import time as t
+from pathlib import Path
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.utils.logging_setup import get_logger
+from modules.utils.db_partitions import partition_paths
+
+log = get_logger("CompactDB")
+
+load_dotenv()
+# Ceiling on how fast compaction reads and writes the live database file
+COMPACT_RATE_MB = float(os.getenv("COMPACT_RATE_MB", 50))
+# Files with less than this share of free pages are left alone
+COMPACT_MIN_FREE_PERCENT = float(os.getenv("COMPACT_MIN_FREE_PERCENT", 20))
+# Hours between compaction passes in the market daemon; 0 leaves compaction to the CLI
+COMPACT_INTERVAL_HOURS = float(os.getenv("COMPACT_INTERVAL_HOURS", 0))
+# Pages copied per backup step; the rate limit is applied between steps
+COMPACT_STEP_PAGES = 1024
+# Virtual machine steps between rate checks while VACUUM INTO writes the copy
+COMPACT_VACUUM_STEPS = 10_000
+# Extra free disk space required on top of the copy and the WAL, in percent
+COMPACT_SPACE_MARGIN = 10
+
+# === Online compaction ===
+# 1. The live file is written out compacted with VACUUM INTO, which leaves its free pages
+#    behind. It reads a consistent snapshot of the file, and is held to COMPACT_RATE_MB by
+#    watching the copy grow (see throttled_vacuum). The copy is then quick_check'ed.
+# 2. The compacted copy is written back over the live file with the backup API, as a single
+#    write transaction through the WAL, at the same rate.
+# 3. A checkpoint folds that transaction into the file and truncates it to the compacted
+#    size. This is the one phase that is not rate limited: sqlite checkpoints a transaction
+#    in one go, so it is a single sequential write of the compacted size at disk speed.
+#
+# Step 2 is why this never renames files. Renaming a new file over a WAL database that other
+# processes still have open leaves them on the old inode, and when one of them closes its
+# connection sqlite checkpoints the new file's WAL into the old inode and deletes it. Written
+# back in place, the bot and the webapp keep their connections, go on reading the old pages
+# until the commit and the compacted ones after, and never find the file missing.
+#
+# The copy and the WAL of step 2 are each about the size of the compacted file, so that much
+# free disk space twice over (plus COMPACT_SPACE_MARGIN) is checked for before starting.
+#
+# The ingester must not write to the file while this runs (it would be overwritten by the
+# copy): the market daemon runs compaction between its own pulls, and older partitions are
+# never written to at all.
+
+def free_percent(conn):
+    (free_pages,) = conn.execute("PRAGMA freelist_count").fetchone()
+    (pages,) = conn.execute("PRAGMA page_count").fetchone()
+    return 100 * free_pages / pages if pages else 0.0
+
+def used_bytes(conn):
+    (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+    (free_pages,) = conn.execute("PRAGMA freelist_count").fetchone()
+    (pages,) = conn.execute("PRAGMA page_count").fetchone()
+    return (pages - free_pages) * page_size
+
+def throttle(start, copied_bytes):
+    # Sleeps for as long as the copy is ahead of COMPACT_RATE_MB
+    if COMPACT_RATE_MB > 0:
+        ahead = copied_bytes / 1024 / 1024 / COMPACT_RATE_MB - (t.monotonic() - start)
+        if ahead > 0:
+            t.sleep(ahead)
+
+def throttled_backup(source, target, label):
+    # Copies source into target, sleeping between steps to stay under COMPACT_RATE_MB
+    (page_size,) = source.execute("PRAGMA page_size").fetchone()
+    start = t.monotonic()
+
+    def progress(status, remaining, total):
+        throttle(start, (total - remaining) * page_size)
+        log.debug(f"{label}: {total - remaining}/{total} pages")
+
+    source.backup(target, pages=COMPACT_STEP_PAGES, progress=progress if COMPACT_RATE_MB > 0 else None)
+
+def throttled_vacuum(source, tmp_path):
+    # VACUUM INTO writes the copy out as it goes, so its size on disk is how far it has got;
+    # the progress handler runs every COMPACT_VACUUM_STEPS virtual machine steps and sleeps
+    # whenever the copy is ahead of COMPACT_RATE_MB
+    start = t.monotonic()
+
+    def progress():
+        throttle(start, tmp_path.stat().st_size if tmp_path.exists() else 0)
+        return 0
+
+    if COMPACT_RATE_MB > 0:
+        source.set_progress_handler(progress, COMPACT_VACUUM_STEPS)
+    try:
+        source.execute("VACUUM INTO ?", (str(tmp_path),))
+    finally:
+        source.set_progress_handler(None, 0)
+
+def compact_file(db_path, min_free_percent=COMPACT_MIN_FREE_PERCENT):
+    # Blocking; run it with asyncio.to_thread from async code. Returns the bytes reclaimed.
+    db_path = Path(db_path)
+    tmp_path = db_path.with_name(db_path.name + ".compact")
+    tmp_files = [tmp_path] + [tmp_path.with_name(tmp_path.name + suffix) for suffix in ("-journal", "-wal", "-shm")]
+    for file in tmp_files:
+        file.unlink(missing_ok=True)
+
+    live = sqlite3.connect(db_path, timeout=60)
+    try:
+        percent = free_percent(live)
+        if percent < min_free_percent:
+            log.debug(f"{db_path.name} is {percent:.1f}% free pages, not compacting")
+            return 0
+        needed = 2 * used_bytes(live) * (1 + COMPACT_SPACE_MARGIN / 100)
+        disk_free = shutil.disk_usage(db_path.parent).free
+        if disk_free < needed:
+            log.warning(f"Not compacting {db_path.name}: it needs {needed / 1024 / 1024:.0f} MB of free disk space, {disk_free / 1024 / 1024:.0f} MB is free")
+            return 0
+        size = db_path.stat().st_size
+        log.info(f"Compacting {db_path.name} ({size / 1024 / 1024:.1f} MB, {percent:.1f}% free pages)")
+        start = t.perf_counter()
+
+        # Anything committed to the live file after this would be lost in step 2
+        (data_version,) = live.execute("PRAGMA data_version").fetchone()
+        throttled_vacuum(live, tmp_path)
+        tmp = sqlite3.connect(tmp_path)
+        try:
+            (check,) = tmp.execute("PRAGMA quick_check").fetchone()
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"quick_check of the compacted copy of {db_path.name} failed: {check}")
+
+            if live.execute("PRAGMA data_version").fetchone()[0] != data_version:
+                log.warning(f"{db_path.name} was written to while it was being compacted, leaving it as it is")
+                return 0
+            throttled_backup(tmp, live, f"Writing back {db_path.name}")
+        finally:
+            tmp.close()
+
+        # Folds the rewritten pages from the WAL into the file, which also shrinks it to the
+        # compacted size; if a reader is still on an old snapshot, a later checkpoint finishes it
+        busy, _, _ = live.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        if busy:
+            log.info(f"Readers kept {db_path.name}'s WAL from being truncated; the next checkpoint will")
+        reclaimed = size - db_path.stat().st_size
+        log.info(f"Compacted {db_path.name} in {t.perf_counter() - start:.1f}s, {reclaimed / 1024 / 1024:.1f} MB reclaimed")
+        return reclaimed
+    finally:
+        live.close()
+        for file in tmp_files:
+            file.unlink(missing_ok=True)
+
+async def compact_market(base_path, min_free_percent=COMPACT_MIN_FREE_PERCENT):
+    # Compacts every partition of a market that has enough free space to be worth it
+    reclaimed = 0
+    for path in partition_paths(base_path):
+        if path.exists():
+            reclaimed += await asyncio.to_thread(compact_file, path, min_free_percent)
+    return reclaimed
+
+async def main():
+    from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+
+    if args.db_path:
+        await asyncio.to_thread(compact_file, args.db_path, args.min_free_percent)
+        return
+    for base_path in (MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX):
+        reclaimed = await compact_market(base_path, args.min_free_percent)
+        print(f"{base_path.stem}: {reclaimed / 1024 / 1024:.1f} MB reclaimed")
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Compact market databases in place while the bot is live, rate limited to COMPACT_RATE_MB (all but the final checkpoint). Needs about twice the compacted size in free disk space. Stop the ingester first, or let the market daemon run this itself (COMPACT_INTERVAL_HOURS).")
+    parser.add_argument("--db_path", type=Path, help="A single market database file (default: every partition of every market)")
+    parser.add_argument("--min_free_percent", type=float, default=COMPACT_MIN_FREE_PERCENT, help="Skip files with less free space than this (0 compacts everything)")
+    args = parser.parse_args()
+
+    asyncio.run(main())
@@ -1,65 +1,217 @@
 import aiosqlite
+import sqlite3
 from datetime import datetime, timedelta, UTC
 import os
+import sys
 import argparse
 import asyncio
+import time as t
 from pathlib import Path
 from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
 from modules.utils.logging_setup import get_logger
+from modules.esi.data_control import market_orders_clustered
+from modules.utils.db_partitions import partition_paths
+from modules.utils.order_archive import ARCHIVE_COLD_DATA, archived_through
 
 log = get_logger("DataPrune")
 
 load_dotenv()
-PRUNE_AGE_DAYS = int(os.getenv("PRUNE_AGE_DAYS"))
+# Orders older than this are thinned out; 0 turns pruning off
+PRUNE_AGE_DAYS = int(os.getenv("PRUNE_AGE_DAYS", 0))
+# Seconds the market daemon spends pruning after each snapshot; 0 leaves pruning to the CLI
+PRUNE_BUDGET_SECONDS = float(os.getenv("PRUNE_BUDGET_SECONDS", 0))
+# Width of the time slice one batch thins for one type
+PRUNE_SLICE_SECONDS = int(os.getenv("PRUNE_SLICE_SECONDS", 86400))
+# Pause between batches, so the ingester and anything else waiting can take the write lock
+PRUNE_PAUSE_SECONDS = float(os.getenv("PRUNE_PAUSE_SECONDS", 0.05))
+# One old row in this many is kept, per type and in timestamp order
+PRUNE_KEEP_EVERY = 4
 
-parser = argparse.ArgumentParser()
-parser.add_argument("--db_path", type=Path, required=True)
-args = parser.parse_args()
+# === Incremental pruning ===
+# Pruning runs in sweeps. A sweep thins every type's rows between the previous sweep's
+# cutoff and its own, one (type, time slice) batch at a time; each batch is a short
+# transaction that deletes its rows and moves the cursor together, so a run can stop at
+# any point (time budget, a busy ingester, a crash) and the next picks up exactly where it
+# left off, without ever thinning the same rows twice. Every lookup and delete is an index
+# seek on (type_id, timestamp), in either market_orders layout.
 
-db_path = args.db_path
+async def create_prune_cursor_table(db):
+    # One row per pruned table: the sweep in progress and how far into it pruning has got.
+    # type_id is -1 before the sweep reaches the first type, and NULL once it is finished.
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS prune_cursor (
+            table_name TEXT PRIMARY KEY,
+            sweep_from INTEGER NOT NULL,
+            sweep_to INTEGER NOT NULL,
+            type_id INTEGER,
+            timestamp INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    """)
 
-async def prune_old_data(DB_FILE):
+async def load_cursor(db):
+    async with db.execute("SELECT sweep_from, sweep_to, type_id, timestamp FROM prune_cursor WHERE table_name = 'market_orders'") as cursor:
+        return await cursor.fetchone()
 
-    cutoff = datetime.now(UTC) - timedelta(days=PRUNE_AGE_DAYS)
-    cutoff_str = cutoff.isoformat()
-    
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        
-        command = """
-            DELETE FROM market_orders
-            WHERE timestamp < ?
-            AND rowid IN (
-                WITH numbered AS (
-                    SELECT 
-                        rowid,
-                        ROW_NUMBER() OVER (
-                            PARTITION BY type_id 
-                            ORDER BY timestamp ASC
-                        ) AS row_num
-                    FROM market_orders
-                    WHERE timestamp < ?
-                )
-            SELECT rowid
-            FROM numbered
-            WHERE row_num % 4 != 1
+async def save_cursor(db, sweep_from, sweep_to, type_id, timestamp):
+    await db.execute("""
+        INSERT OR REPLACE INTO prune_cursor (table_name, sweep_from, sweep_to, type_id, timestamp, updated_at)
+        VALUES ('market_orders', ?, ?, ?, ?, ?)
+    """, (sweep_from, sweep_to, type_id, timestamp, int(t.time())))
+
+def delete_sql(clustered):
+    # A clustered market_orders has no rowid; its primary key picks out a row instead
+    row_key = "(type_id, timestamp, order_id)" if clustered else "rowid"
+    return f"""
+        DELETE FROM market_orders
+        WHERE {row_key} IN (
+            SELECT {row_key.strip("()")}
+            FROM (
+                SELECT
+                    {row_key.strip("()")},
+                    ROW_NUMBER() OVER (ORDER BY timestamp ASC) AS row_num
+                FROM market_orders
+                WHERE type_id = ?
+                AND timestamp >= ?
+                AND timestamp < ?
+            )
+            WHERE row_num % {PRUNE_KEEP_EVERY} != 1
         )
-        """
-
-        params = [cutoff_str, cutoff_str]
-        
-        async with db.execute(command, tuple(params)) as cursor:
-        
-            deleted_count = cursor.rowcount
-            log.info(f"Pruned {deleted_count} entries")
-            
-        await db.commit()
-        await db.close()
+    """
+
+async def next_batch(db, sweep_from, sweep_to, type_id, timestamp):
+    # The first (type, timestamp) at or after the cursor with rows left to thin in this sweep
+    while True:
+        async with db.execute(
+            "SELECT MIN(timestamp) FROM market_orders WHERE type_id = ? AND timestamp >= ? AND timestamp < ?",
+            (type_id, timestamp, sweep_to)
+        ) as cursor:
+            (first,) = await cursor.fetchone()
+        if first is not None:
+            return type_id, first
+        async with db.execute("SELECT MIN(type_id) FROM market_orders WHERE type_id > ?", (type_id,)) as cursor:
+            (type_id,) = await cursor.fetchone()
+        if type_id is None:
+            return None
+        timestamp = sweep_from
+
+async def prune_file(db_path, deadline=None, cutoff=None):
+    # Prunes one market database file until its sweep is done or the deadline (a
+    # time.monotonic() value) passes. Returns (rows deleted, whether the sweep finished).
+    if cutoff is None:
+        cutoff = int((datetime.now(UTC) - timedelta(days=PRUNE_AGE_DAYS)).timestamp())
+    deleted = 0
+
+    async with aiosqlite.connect(db_path, timeout=30) as db:
+        await create_prune_cursor_table(db)
+        clustered = await market_orders_clustered(db)
+        command = delete_sql(clustered)
+
+        state = await load_cursor(db)
+        if state is None or state[2] is None:
+            # Starting a new sweep over everything that has aged past the cutoff since the
+            # last one, once there is at least a slice's worth of it
+            sweep_from = 0 if state is None else state[1]
+            if cutoff - sweep_from < PRUNE_SLICE_SECONDS:
+                log.debug(f"Nothing new to prune in {db_path}")
+                return deleted, True
+            sweep_to, type_id, timestamp = cutoff, -1, sweep_from
+            await save_cursor(db, sweep_from, sweep_to, type_id, timestamp)
+            await db.commit()
+            log.info(f"Starting a prune sweep of {db_path} up to {datetime.fromtimestamp(sweep_to, UTC):%Y-%m-%d %H:%M}")
+        else:
+            sweep_from, sweep_to, type_id, timestamp = state
+
+        batches = 0
+        start = t.perf_counter()
+        try:
+            while deadline is None or t.monotonic() < deadline:
+                batch = await next_batch(db, sweep_from, sweep_to, type_id, timestamp)
+                if batch is None:
+                    await save_cursor(db, sweep_from, sweep_to, None, sweep_to)
+                    await db.commit()
+                    log.info(f"Finished the prune sweep of {db_path}")
+                    return deleted, True
+
+                type_id, slice_start = batch
+                slice_end = min(slice_start + PRUNE_SLICE_SECONDS, sweep_to)
+                # BEGIN IMMEDIATE waits for the write lock here, rather than failing halfway through
+                await db.execute("BEGIN IMMEDIATE")
+                try:
+                    async with db.execute(command, (type_id, slice_start, slice_end)) as cursor:
+                        deleted += cursor.rowcount
+                    await save_cursor(db, sweep_from, sweep_to, type_id, slice_end)
+                    await db.commit()
+                except BaseException:
+                    await db.rollback()
+                    raise
+                timestamp = slice_end
+                batches += 1
+                await asyncio.sleep(PRUNE_PAUSE_SECONDS)
+            # Out of time; saving the types skipped over since the last batch as well
+            await save_cursor(db, sweep_from, sweep_to, type_id, timestamp)
+            await db.commit()
+        except sqlite3.OperationalError as e:
+            # The ingester held the lock past the busy timeout; the cursor is where the last
+            # committed batch left it
+            log.info(f"Stopping pruning of {db_path} early: {e}")
+        finally:
+            log.info(f"Pruned {deleted} entries from {db_path} in {batches} batches, {t.perf_counter() - start:.1f}s")
+    return deleted, False
+
+async def prune_market(base_path, budget_seconds=PRUNE_BUDGET_SECONDS):
+    # Prunes a market's partitions oldest first within the budget (0: until done)
+    if PRUNE_AGE_DAYS <= 0:
+        return 0
+    deadline = t.monotonic() + budget_seconds if budget_seconds > 0 else None
+    cutoff = int((datetime.now(UTC) - timedelta(days=PRUNE_AGE_DAYS)).timestamp())
+    if ARCHIVE_COLD_DATA:
+        # Never thinning a month before it is in the archive at full resolution
+        cutoff = min(cutoff, archived_through(base_path))
+    deleted = 0
+    for path in reversed(partition_paths(base_path, None, cutoff)):
+        if deadline is not None and t.monotonic() >= deadline:
+            break
+        if not path.exists():
+            continue
+        file_deleted, finished = await prune_file(path, deadline, cutoff)
+        deleted += file_deleted
+        if not finished:
+            break
+    return deleted
+
+async def prune_old_data(DB_FILE):
+    # Prunes one file until it is done, as this script always has
+    deleted, _ = await prune_file(DB_FILE)
+    return deleted
 
 async def main():
-    await prune_old_data(db_path)
+    from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+
+    if PRUNE_AGE_DAYS <= 0:
+        print("PRUNE_AGE_DAYS is not set, nothing to prune")
+        return
+    deadline = t.monotonic() + args.budget_seconds if args.budget_seconds > 0 else None
+    if args.db_path:
+        await prune_file(args.db_path, deadline)
+        return
+    for base_path in (MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX):
+        remaining = deadline - t.monotonic() if deadline is not None else 0
+        if deadline is not None and remaining <= 0:
+            break
+        await prune_market(base_path, remaining)
 
-asyncio.run(main())
-    
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Thin out market orders older than PRUNE_AGE_DAYS in small batches. Safe to run while the ingester and the bot are live, and to stop at any point.")
+    parser.add_argument("--db_path", type=Path, help="A single market database file (default: every partition of every market)")
+    parser.add_argument("--budget_seconds", type=float, default=PRUNE_BUDGET_SECONDS, help="Stop after about this long and resume from there next run (default: PRUNE_BUDGET_SECONDS, 0 runs until done)")
+    args = parser.parse_args()
 
-    
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time as t
+from datetime import datetime, UTC
+from pathlib import Path
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.utils.logging_setup import get_logger
+
+log = get_logger("DBPartitions")
+
+load_dotenv()
+# Months of snapshots per market database file; 0 keeps everything in the one file
+DB_PARTITION_MONTHS = int(os.getenv("DB_PARTITION_MONTHS", 1))
+# Partitions entirely older than this are deleted when a new one is started; 0 keeps them all
+PARTITION_RETENTION_DAYS = int(os.getenv("PARTITION_RETENTION_DAYS", 0))
+# sqlite's compiled-in limit on attached databases
+MAX_ATTACHED = 10
+
+# === Partition layout ===
+# data/jita_market_prices.db holds everything from before partitioning and is kept as it is.
+# New snapshots go to data/jita_market_prices_<YYYY>_<MM>.db, named after the month the
+# partition starts in; a partition runs until the next one starts.
+PARTITION_SUFFIX = re.compile(r"_(\d{4})_(\d{2})$")
+
+def month_start(index):
+    return int(datetime(index // 12, index % 12 + 1, 1, tzinfo=UTC).timestamp())
+
+def month_index(timestamp):
+    # Months since year 0, the inverse of month_start
+    moment = datetime.fromtimestamp(timestamp, UTC)
+    return moment.year * 12 + moment.month - 1
+
+def partition_path(base_path, timestamp=None):
+    # The file a snapshot taken at timestamp (default: now) is written to
+    base_path = Path(base_path)
+    if DB_PARTITION_MONTHS <= 0:
+        return base_path
+    index = month_index(t.time() if timestamp is None else timestamp)
+    index -= index % DB_PARTITION_MONTHS
+    return base_path.with_name(f"{base_path.stem}_{index // 12:04d}_{index % 12 + 1:02d}{base_path.suffix}")
+
+def list_partitions(base_path):
+    # [(start, end, path)] oldest first, end being the start of the next partition
+    base_path = Path(base_path)
+    starts = []
+    for path in base_path.parent.glob(f"{base_path.stem}_*{base_path.suffix}"):
+        # Skipping the likes of jita_market_prices_clone.db
+        match = PARTITION_SUFFIX.search(path.stem)
+        if match is None or path.stem[:match.start()] != base_path.stem:
+            continue
+        starts.append((month_start(int(match.group(1)) * 12 + int(match.group(2)) - 1), path))
+    starts.sort()
+    ends = [start for start, _ in starts[1:]] + [float("inf")]
+    return [(start, end, path) for (start, path), end in zip(starts, ends)]
+
+def partition_paths(base_path, start=None, end=None):
+    # Newest first: every existing file holding snapshots in [start, end]
+    base_path = Path(base_path)
+    if DB_PARTITION_MONTHS <= 0:
+        return [base_path]
+    partitions = list_partitions(base_path)
+    paths = [path for p_start, p_end, path in reversed(partitions) if (end is None or p_start <= end) and (start is None or p_end > start)]
+    # The pre-partitioning file is only opened when the range reaches back before the partitions
+    if base_path.exists() and (not partitions or start is None or start < partitions[0][0]):
+        paths.append(base_path)
+    return paths
+
+# === Reading across partitions ===
+# The newest file is opened as main and the rest are attached. Each table is then shadowed
+# by a TEMP view of the UNION ALL of that table in every file; unqualified names resolve to
+# temp first, so the existing read queries run unchanged. sqlite pushes a query's WHERE
+# terms down into each arm of the view, so every file is still searched by its own indexes.
+
+def range_paths(base_path, start=None, end=None):
+    # The files a read over [start, end] opens, newest first. With nothing on disk yet this
+    # is the current partition, which the pool then treats as empty (it is never created).
+    paths = partition_paths(base_path, start, end) or [partition_path(base_path)]
+    if len(paths) > MAX_ATTACHED:
+        log.warning(f"Range spans {len(paths)} {Path(base_path).stem} files, reading only the newest {MAX_ATTACHED}")
+        paths = paths[:MAX_ATTACHED]
+    return paths
+
+def attach_partitions(conn, paths):
+    # conn is a plain sqlite3 connection to the newest file (see modules/utils/db_pool.py)
+    schemas = ["main"]
+    for number, path in enumerate(paths, start=1):
+        conn.execute(f"ATTACH DATABASE ? AS p{number}", (f"file:{path}?mode=ro",))
+        schemas.append(f"p{number}")
+
+    tables = {}
+    for schema in schemas:
+        for (table,) in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"):
+            tables.setdefault(table, []).append(schema)
+    for table, present in tables.items():
+        # Only the columns every file has: a clustered market_orders carries an order_id
+        # that a heap one does not (see data_control.market_orders_clustered)
+        columns = [row[1] for row in conn.execute(f"PRAGMA {present[0]}.table_info({table})")]
+        for schema in present[1:]:
+            have = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+            columns = [column for column in columns if column in have]
+        select = ", ".join(columns)
+        union = " UNION ALL ".join(f"SELECT {select} FROM {schema}.{table}" for schema in present)
+        conn.execute(f"CREATE TEMP VIEW {table} AS {union}")
+
+# === Retention ===
+
+def drop_old_partitions(base_path, retention_days=PARTITION_RETENTION_DAYS):
+    # Deleting whole files replaces the row-by-row prune, VACUUM and file swap
+    if retention_days <= 0 or DB_PARTITION_MONTHS <= 0:
+        return []
+    cutoff = t.time() - retention_days * 86400
+    dropped = []
+    for _, end, path in list_partitions(base_path):
+        if end > cutoff:
+            break
+        for file in (path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+            file.unlink(missing_ok=True)
+        log.info(f"Dropped partition {path.name}, it is older than {retention_days} days")
+        dropped.append(path)
+    return dropped
+
+async def main():
+    from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+
+    for base_path in (MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX):
+        print(f"{base_path.name}:")
+        for path in reversed(partition_paths(base_path)):
+            print(f"  {path.name} ({path.stat().st_size / 1024 / 1024:.1f} MB)" if path.exists() else f"  {path.name} (missing)")
+        if args.drop_older_than:
+            for path in drop_old_partitions(base_path, args.drop_older_than):
+                print(f"  dropped {path.name}")
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="List each market's database partitions and optionally drop old ones.")
+    parser.add_argument("--drop_older_than", type=int, default=0, help="Delete partitions entirely older than this many days")
+    args = parser.parse_args()
+
+    asyncio.run(main())
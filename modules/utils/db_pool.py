@@ -0,0 +1,162 @@
+import asyncio
+import os
+import sqlite3
+import time as t
+from pathlib import Path
+from dotenv import load_dotenv
+from modules.utils.logging_setup import get_logger
+from modules.utils.db_partitions import range_paths, attach_partitions
+
+log = get_logger("DBPool")
+
+load_dotenv()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 64 * 1024))
+DB_POOL_IDLE_SECONDS = float(os.getenv("DB_POOL_IDLE_SECONDS", 600))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 500))
+# Prepared statements kept per connection; the read paths use a handful of fixed queries
+DB_STATEMENT_CACHE = 256
+
+# Pooled connections are plain sqlite3 connections driven through asyncio.to_thread rather
+# than aiosqlite ones: each aiosqlite connection owns a non-daemon thread, which would keep
+# any script that forgot to close the pool alive after asyncio.run() returned.
+
+class QueryTimings:
+    """Count, total and worst time per named read query, since the process started."""
+
+    def __init__(self):
+        self.queries = {}
+
+    def record(self, name, seconds):
+        count, total, worst = self.queries.get(name, (0, 0.0, 0.0))
+        self.queries[name] = (count + 1, total + seconds, max(worst, seconds))
+
+    def summary(self):
+        return {
+            name: {"count": count, "avg_ms": total / count * 1000, "max_ms": worst * 1000}
+            for name, (count, total, worst) in self.queries.items()
+        }
+
+query_timings = QueryTimings()
+
+class ReadPool:
+    """Warm read-only connections to one market database file, or to the newest of a
+    set of partition files with the rest attached (see db_partitions.attach_partitions)."""
+
+    def __init__(self, paths, size=DB_POOL_SIZE):
+        self.paths = tuple(Path(path) for path in paths)
+        self.size = size
+        self.idle = []
+        self.available = asyncio.Semaphore(size)
+        self.generation = 0
+        self.in_use = 0
+        self.inodes = self._inodes()
+        self.last_used = t.monotonic()
+
+    def _inodes(self):
+        return tuple(os.stat(path).st_ino if path.exists() else None for path in self.paths)
+
+    def _open(self):
+        # Read-only opens never create a file, so a read of a partition that does not exist yet
+        # cannot leave an empty database behind under its name
+        conn = sqlite3.connect(f"file:{self.paths[0]}?mode=ro", uri=True, timeout=15, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        # WAL is set once per file by init_db; these only tune this connection
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if len(self.paths) > 1:
+            attach_partitions(conn, self.paths[1:])
+        # Only after the partition views are in place, since creating them is a (temp) write
+        conn.execute("PRAGMA query_only = 1")
+        return conn, self.generation
+
+    def _fetchall(self, entry, query, params):
+        if entry is None:
+            entry = self._open()
+        return entry, entry[0].execute(query, params).fetchall()
+
+    def _check_files(self):
+        # A file restored from a backup or swapped in by hand comes in under the same name;
+        # connections still on the old inode would keep serving the old file forever
+        inodes = self._inodes()
+        if inodes != self.inodes:
+            log.info(f"{self.paths[0].name} was replaced on disk, reopening its connections")
+            self.inodes = inodes
+            self.generation += 1
+            self.close_idle()
+
+    async def fetchall(self, name, query, params=()):
+        if not self.paths[0].exists():
+            # Nothing has been written to this market (or this month) yet
+            log.debug(f"{name}: {self.paths[0].name} does not exist, no rows")
+            return []
+        await self.available.acquire()
+        self.in_use += 1
+        self.last_used = t.monotonic()
+        self._check_files()
+        entry = self.idle.pop() if self.idle else None
+        try:
+            start = t.perf_counter()
+            entry, rows = await asyncio.to_thread(self._fetchall, entry, query, params)
+            elapsed = t.perf_counter() - start
+        except BaseException:
+            # A connection that failed mid-query is not trusted with the next one
+            if entry is not None:
+                entry[0].close()
+            raise
+        finally:
+            self.in_use -= 1
+            self.available.release()
+
+        if entry[1] == self.generation:
+            self.idle.append(entry)
+        else:
+            entry[0].close()
+
+        query_timings.record(name, elapsed)
+        if elapsed * 1000 >= DB_SLOW_QUERY_MS:
+            log.info(f"Slow query {name} on {self.paths[0].name}: {elapsed * 1000:.0f}ms")
+        else:
+            log.debug(f"{name} on {self.paths[0].name}: {elapsed * 1000:.1f}ms, {len(rows)} rows")
+        return rows
+
+    def close_idle(self):
+        for conn, _ in self.idle:
+            conn.close()
+        self.idle = []
+
+# === Process-wide pools, keyed by the files they read ===
+# asyncio primitives are bound to the loop they are first used on, so the pools are
+# rebuilt if a script runs more than one asyncio.run() in the same process.
+_pools = {}
+_pools_loop = None
+
+def get_pool(paths):
+    global _pools_loop
+    loop = asyncio.get_running_loop()
+    if _pools_loop is not loop:
+        close_db_pools()
+        _pools_loop = loop
+
+    # A pool over last month's set of partitions goes quiet once the month rolls over
+    now = t.monotonic()
+    for key, pool in list(_pools.items()):
+        if now - pool.last_used > DB_POOL_IDLE_SECONDS and pool.in_use == 0:
+            pool.close_idle()
+            del _pools[key]
+
+    key = tuple(Path(path) for path in paths)
+    if key not in _pools:
+        _pools[key] = ReadPool(key)
+    return _pools[key]
+
+def range_pool(base_path, start=None, end=None):
+    # The pool for a read over [start, end] of a partitioned market database
+    return get_pool(range_paths(base_path, start, end))
+
+def close_db_pools():
+    for pool in _pools.values():
+        pool.close_idle()
+    _pools.clear()
@@ -1,20 +1,15 @@
-import sqlite3
 import asyncio
-from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA
-
-async def index_db(DB_PATH):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_market_orders_type_timestamp_price
-            ON market_orders(type_id, timestamp DESC, price ASC);
-        """)
-        conn.commit()
+from modules.utils.init_db import init_db
+from modules.utils.db_partitions import partition_paths
+from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
 
+# Indexes are schema migrations now (modules/utils/schema_migrations.py) and init_db applies
+# them on every start; this stays as a way to bring the databases up to date by hand.
 async def main():
-    print("Indexing GSF DB...")
-    await index_db(MARKET_DB_FILE_GSF)
-    print("Indexing Jita DB...")
-    await index_db(MARKET_DB_FILE_JITA)
+    for name, base_path in (("GSF", MARKET_DB_FILE_GSF), ("Jita", MARKET_DB_FILE_JITA), ("PLEX", MARKET_DB_FILE_PLEX)):
+        for path in partition_paths(base_path):
+            print(f"Indexing {name} DB ({path.name})...")
+            await init_db(path)
     print("Complete!")
 
 asyncio.run(main())
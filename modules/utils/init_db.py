@@ -1,22 +1,129 @@
+import os
 import aiosqlite
+from dotenv import load_dotenv
+from modules.esi.ingest_ledger import create_ingest_runs_table
+from modules.esi.data_control import ROLLUP_TABLES
+from modules.utils.data_prune import create_prune_cursor_table
+from modules.utils.schema_migrations import run_migrations, check_query_plans
+
+load_dotenv()
+# Layout of market_orders in newly created database files, "heap" or "clustered"
+# (see data_control.market_orders_clustered); existing files keep the layout they have
+MARKET_ORDERS_LAYOUT = os.getenv("MARKET_ORDERS_LAYOUT", "heap")
+
+def market_orders_sql(clustered, table="market_orders"):
+    if clustered:
+        return f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                timestamp INTEGER NOT NULL,
+                type_id INTEGER NOT NULL,
+                order_id INTEGER NOT NULL,
+                volume_remain INTEGER NOT NULL,
+                price REAL NOT NULL,
+                is_buy_order BOOLEAN NOT NULL,
+                PRIMARY KEY (type_id, timestamp, order_id)
+            ) WITHOUT ROWID
+        """
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            timestamp INTEGER NOT NULL,
+            type_id INTEGER NOT NULL,
+            volume_remain INTEGER NOT NULL,
+            price REAL NOT NULL,
+            is_buy_order BOOLEAN NOT NULL
+        )
+    """
 
 async def init_db(DB_PATH):
-    async with aiosqlite.connect(DB_PATH) as db:
+    # A generous busy timeout, since another process may be holding the lock while it builds an index
+    async with aiosqlite.connect(DB_PATH, timeout=600) as db:
+        # Persistent per file, so readers never block the ingester (new partitions included)
+        await db.execute("PRAGMA journal_mode=WAL;")
+
+        await db.execute(market_orders_sql(MARKET_ORDERS_LAYOUT == "clustered"))
+
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS market_orders (
+            CREATE TABLE IF NOT EXISTS mineral_prices (
                 timestamp INTEGER NOT NULL,
                 type_id INTEGER NOT NULL,
+                price REAL NOT NULL
+            )
+        """)
+
+        # === Changes-only storage (ORDER_STORAGE_MODE=changes) ===
+        # open_orders is the book as of the last snapshot, order_changes logs every
+        # new / changed / closed order, and order_snapshots lists the snapshot times
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS open_orders (
+                order_id INTEGER PRIMARY KEY,
+                type_id INTEGER NOT NULL,
                 volume_remain INTEGER NOT NULL,
                 price REAL NOT NULL,
-                is_buy_order BOOLEAN NOT NULL
+                is_buy_order BOOLEAN NOT NULL,
+                location_id INTEGER NOT NULL,
+                issued INTEGER NOT NULL,
+                duration INTEGER NOT NULL
             )
         """)
 
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS mineral_prices (
+            CREATE TABLE IF NOT EXISTS order_changes (
                 timestamp INTEGER NOT NULL,
+                order_id INTEGER NOT NULL,
                 type_id INTEGER NOT NULL,
-                price REAL NOT NULL
+                volume_remain INTEGER NOT NULL,
+                price REAL NOT NULL,
+                is_buy_order BOOLEAN NOT NULL,
+                change TEXT NOT NULL
+            )
+        """)
+
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS order_snapshots (
+                timestamp INTEGER NOT NULL UNIQUE,
+                orders INTEGER NOT NULL,
+                changes INTEGER NOT NULL
             )
         """)
-        await db.commit()
\ No newline at end of file
+
+        # One row per (snapshot, type) with the figures every read path needs, so they
+        # never have to scan the raw orders
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS type_snapshots (
+                timestamp INTEGER NOT NULL,
+                type_id INTEGER NOT NULL,
+                min_sell REAL,
+                max_buy REAL,
+                sell_volume INTEGER NOT NULL,
+                buy_volume INTEGER NOT NULL,
+                sell_orders INTEGER NOT NULL,
+                buy_orders INTEGER NOT NULL,
+                PRIMARY KEY (type_id, timestamp)
+            ) WITHOUT ROWID
+        """)
+
+        # Hourly and daily price rollups per type, folded in after every snapshot (see
+        # data_control.update_rollups); long chart windows read these instead of type_snapshots
+        for table in ROLLUP_TABLES.values():
+            await db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    type_id INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    low REAL NOT NULL,
+                    high REAL NOT NULL,
+                    close REAL NOT NULL,
+                    close_timestamp INTEGER NOT NULL,
+                    price_sum REAL NOT NULL,
+                    volume_sum INTEGER NOT NULL,
+                    samples INTEGER NOT NULL,
+                    PRIMARY KEY (type_id, bucket)
+                ) WITHOUT ROWID
+            """)
+
+        await create_ingest_runs_table(db)
+        await create_prune_cursor_table(db)
+        await db.commit()
+
+        # === Indexes and later schema changes ===
+        await run_migrations(db)
+        await check_query_plans(db)
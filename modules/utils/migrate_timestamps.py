@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import sys
+import time as t
+from pathlib import Path
+import aiosqlite
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.utils.logging_setup import get_logger
+from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+from modules.utils.db_partitions import partition_paths
+from modules.esi.data_control import market_orders_clustered
+
+log = get_logger("MigrateTimestamps")
+
+# Table -> (timestamp column, column to walk the table by in chunks)
+TIMESTAMP_COLUMNS = {
+    "market_orders": ("timestamp", "rowid"),
+    "mineral_prices": ("timestamp", "rowid"),
+    "order_changes": ("timestamp", "rowid"),
+    "order_snapshots": ("timestamp", "rowid"),
+    "ingest_runs": ("snapshot_time", "rowid"),
+    "type_snapshots": ("timestamp", "type_id"), # WITHOUT ROWID
+}
+
+# Older rows were written as Python datetimes, which sqlite3 stores as ISO strings
+# ("2025-01-01 00:00:00.123456+00:00"). strftime('%s') understands every variant of
+# those, including the UTC offset, and truncates to whole seconds.
+CONVERT_SQL = "UPDATE {table} SET {column} = CAST(strftime('%s', {column}) AS INTEGER) WHERE {chunk_column} BETWEEN ? AND ? AND typeof({column}) = 'text'"
+
+async def table_exists(db, table):
+    async with db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)) as cursor:
+        return await cursor.fetchone() is not None
+
+async def migrate_table(db, table, column, chunk_column, chunk_size):
+    async with db.execute(f"SELECT MIN({chunk_column}), MAX({chunk_column}) FROM {table}") as cursor:
+        low, high = await cursor.fetchone()
+    if low is None:
+        log.info(f"{table} is empty, nothing to convert")
+        return 0
+
+    # One short transaction per chunk keeps the WAL small on multi-GB files, and since only
+    # text rows are touched the tool can be stopped and re-run at any point
+    step = chunk_size if chunk_column == "rowid" else max(chunk_size // 1000, 1)
+    converted = 0
+    start = t.perf_counter()
+    for chunk_start in range(low, high + 1, step):
+        async with db.execute(CONVERT_SQL.format(table=table, column=column, chunk_column=chunk_column), (chunk_start, chunk_start + step - 1)) as cursor:
+            converted += cursor.rowcount
+        await db.commit()
+        done = (min(chunk_start + step, high + 1) - low) / (high + 1 - low)
+        log.debug(f"{table}: {done:.0%} scanned, {converted} rows converted")
+
+    log.info(f"{table}: converted {converted} rows in {t.perf_counter() - start:.1f}s")
+    return converted
+
+async def migrate_database(db_path, chunk_size):
+    log.info(f"Converting timestamps in {db_path} to integer Unix seconds")
+    async with aiosqlite.connect(db_path) as db:
+        await db.execute("PRAGMA journal_mode=WAL;")
+        for table, (column, chunk_column) in TIMESTAMP_COLUMNS.items():
+            if await table_exists(db, table):
+                if table == "market_orders" and await market_orders_clustered(db):
+                    chunk_column = "type_id" # WITHOUT ROWID, see modules/utils/cluster_market_orders.py
+                await migrate_table(db, table, column, chunk_column, chunk_size)
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+async def main():
+    db_paths = [args.db_path] if args.db_path else [path for base_path in (MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX) for path in partition_paths(base_path)]
+    for db_path in db_paths:
+        if not Path(db_path).exists():
+            print(f"Skipping {db_path}, it does not exist")
+            continue
+        await migrate_database(db_path, args.chunk_size)
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Convert ISO string timestamps to integer Unix seconds in place. Stop the ingester first; it is safe to interrupt and re-run.")
+    parser.add_argument("--db_path", type=Path, help="A single market database file (default: every partition of every market)")
+    parser.add_argument("--chunk_size", type=int, default=200_000, help="Rows per transaction")
+    args = parser.parse_args()
+
+    asyncio.run(main())
@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import time as t
+import zipfile
+from datetime import datetime, UTC
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.utils.logging_setup import get_logger
+from modules.utils.paths import ARCHIVE_DIR
+from modules.utils.db_partitions import list_partitions, partition_paths, month_start, month_index
+
+log = get_logger("OrderArchive")
+
+load_dotenv()
+# Archive every finished month before pruning or partition retention can touch it
+ARCHIVE_COLD_DATA = os.getenv("ARCHIVE_COLD_DATA") == "True"
+
+# === Archive layout ===
+# data/archive/<market db stem>_<YYYY>_<MM>.npz holds one calendar month of a market at full
+# resolution, written once the month is over. Each type's data is its own set of members,
+# one per column and sorted by timestamp, so a read decompresses only the type it asks for:
+#     type_ids                        every type in the archive
+#     orders/<type_id>/<column>       market_orders rows (ORDER_COLUMNS)
+#     snapshots/<type_id>/<column>    type_snapshots rows (SNAPSHOT_COLUMNS), NaN for NULL prices
+ORDER_COLUMNS = {
+    "timestamp": np.int64,
+    "price": np.float64,
+    "volume_remain": np.int64,
+    "is_buy_order": np.bool_,
+}
+SNAPSHOT_COLUMNS = {
+    "timestamp": np.int64,
+    "min_sell": np.float64,
+    "max_buy": np.float64,
+    "sell_volume": np.int64,
+    "buy_volume": np.int64,
+    "sell_orders": np.int64,
+    "buy_orders": np.int64,
+}
+ARCHIVE_TABLES = {"orders": ("market_orders", ORDER_COLUMNS), "snapshots": ("type_snapshots", SNAPSHOT_COLUMNS)}
+
+def archive_path(base_path, index):
+    base_path = Path(base_path)
+    return ARCHIVE_DIR / f"{base_path.stem}_{index // 12:04d}_{index % 12 + 1:02d}.npz"
+
+# === Writing ===
+
+def type_ids(conn, table):
+    # Every type in the table, found by seeking the (type_id, ...) index one type at a time
+    found = []
+    type_id = -1
+    while True:
+        (type_id,) = conn.execute(f"SELECT MIN(type_id) FROM {table} WHERE type_id > ?", (type_id,)).fetchone()
+        if type_id is None:
+            return found
+        found.append(type_id)
+
+def oldest_timestamp(conn):
+    # A heap market_orders is in insertion order, so its first row is the oldest; anything
+    # else falls back to scanning the much smaller type_snapshots
+    clustered = conn.execute("SELECT 1 FROM pragma_table_info('market_orders') WHERE name = 'order_id'").fetchone()
+    if not clustered:
+        row = conn.execute("SELECT timestamp FROM market_orders ORDER BY rowid LIMIT 1").fetchone()
+        if row is not None:
+            return row[0]
+    return conn.execute("SELECT MIN(timestamp) FROM type_snapshots").fetchone()[0]
+
+def write_column(archive, name, values, dtype):
+    with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+        np.lib.format.write_array(member, np.asarray(values, dtype=dtype), allow_pickle=False)
+
+def archive_month(base_path, index):
+    # Blocking; writes the month's archive from every file holding part of it. Returns the path.
+    start, end = month_start(index), month_start(index + 1)
+    path = archive_path(base_path, index)
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    conns = []
+    for db_path in partition_paths(base_path, start, end - 1):
+        if db_path.exists():
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=15)
+            conns.append(conn)
+    try:
+        all_types = sorted({type_id for conn in conns for table in ("market_orders", "type_snapshots") for type_id in type_ids(conn, table)})
+        archived = []
+        rows_written = 0
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for type_id in all_types:
+                written = False
+                for kind, (table, columns) in ARCHIVE_TABLES.items():
+                    query = f"SELECT {', '.join(columns)} FROM {table} WHERE type_id = ? AND timestamp >= ? AND timestamp < ?"
+                    rows = [row for conn in conns for row in conn.execute(query, (type_id, start, end))]
+                    if not rows:
+                        continue
+                    rows.sort(key=lambda row: row[0])
+                    for (column, dtype), values in zip(columns.items(), zip(*rows)):
+                        if dtype is np.float64:
+                            values = [np.nan if value is None else value for value in values]
+                        write_column(archive, f"{kind}/{type_id}/{column}", values, dtype)
+                    rows_written += len(rows)
+                    written = True
+                if written:
+                    archived.append(type_id)
+            # A month with nothing in it still gets an (empty) archive, so it is not retried
+            write_column(archive, "type_ids", archived, np.int64)
+        os.replace(tmp_path, path)
+    finally:
+        for conn in conns:
+            conn.close()
+        tmp_path.unlink(missing_ok=True)
+
+    log.info(f"Archived {rows_written} rows of {len(archived)} types to {path.name} ({path.stat().st_size / 1024 / 1024:.1f} MB)")
+    return path
+
+def unarchived_months(base_path, before=None):
+    # Month indexes with data in the market's files, finished before `before` (default: the
+    # start of this month) and not archived yet, oldest first
+    last = month_index(t.time() if before is None else before) - 1
+    base_path = Path(base_path)
+    firsts = [month_index(start) for start, _, _ in list_partitions(base_path)]
+    if base_path.exists():
+        conn = sqlite3.connect(f"file:{base_path}?mode=ro", uri=True, timeout=15)
+        try:
+            oldest = oldest_timestamp(conn)
+        finally:
+            conn.close()
+        if oldest is not None:
+            firsts.append(month_index(oldest))
+    if not firsts:
+        return []
+    return [index for index in range(min(firsts), last + 1) if not archive_path(base_path, index).exists()]
+
+async def archive_market(base_path, before=None, limit=None):
+    # Archives every finished month that is not archived yet, oldest first, or only the
+    # first `limit` of them; returns the new archive paths
+    written = []
+    for index in (await asyncio.to_thread(unarchived_months, base_path, before))[:limit]:
+        written.append(await asyncio.to_thread(archive_month, base_path, index))
+    return written
+
+def archived_through(base_path):
+    # The end of the newest archived month, or 0 if nothing is archived: pruning stops there
+    # so that nothing is thinned before its month has been archived at full resolution
+    base_path = Path(base_path)
+    newest = None
+    for path in ARCHIVE_DIR.glob(f"{base_path.stem}_*.npz"):
+        year, month = path.stem[len(base_path.stem) + 1:].split("_")
+        index = int(year) * 12 + int(month) - 1
+        newest = index if newest is None else max(newest, index)
+    return 0 if newest is None else month_start(newest + 1)
+
+# === Reading ===
+# Archives are only ever replaced whole, so an open archive is reused until its file changes
+
+@lru_cache(maxsize=32)
+def open_archive(path, mtime_ns):
+    return np.load(path, allow_pickle=False)
+
+def read_columns(base_path, type_id, kind, start, end):
+    # One type's archived columns over [start, end), oldest first; {} if nothing is archived
+    columns = ORDER_COLUMNS if kind == "orders" else SNAPSHOT_COLUMNS
+    parts = {column: [] for column in columns}
+    if end <= start:
+        return {}
+    for index in range(month_index(start), month_index(end - 1) + 1):
+        path = archive_path(base_path, index)
+        if not path.exists():
+            continue
+        archive = open_archive(str(path), path.stat().st_mtime_ns)
+        if f"{kind}/{type_id}/timestamp" not in archive.files:
+            continue
+        timestamps = archive[f"{kind}/{type_id}/timestamp"]
+        keep = (timestamps >= start) & (timestamps < end)
+        for column in columns:
+            parts[column].append(archive[f"{kind}/{type_id}/{column}"][keep])
+    if not parts["timestamp"]:
+        return {}
+    return {column: np.concatenate(values) for column, values in parts.items()}
+
+async def archived_min_sell(base_path, type_id, start, end):
+    # Rows shaped like graph_generator's type_snapshots query, oldest first
+    data = await asyncio.to_thread(read_columns, base_path, type_id, "snapshots", start, end)
+    if not data:
+        return []
+    keep = ~np.isnan(data["min_sell"])
+    return [
+        {"timestamp": timestamp, "type_id": type_id, "price": price, "is_buy_order": 0}
+        for timestamp, price in zip(data["timestamp"][keep].tolist(), data["min_sell"][keep].tolist())
+    ]
+
+async def archived_lowest_price_per_day(base_path, type_id, start, end):
+    # Rows shaped like LOWEST_PRICE_PER_DAY_QUERY's, newest day first
+    lowest = {}
+    for row in await archived_min_sell(base_path, type_id, start, end):
+        day = datetime.fromtimestamp(row["timestamp"], UTC).strftime("%Y-%m-%d")
+        lowest[day] = min(lowest.get(day, row["price"]), row["price"])
+    return [{"order_date": day, "lowest_price": price} for day, price in sorted(lowest.items(), reverse=True)]
+
+async def archived_rollups(base_path, type_id, start, end, seconds):
+    # Rows shaped like data_control's rollup queries, bucketed from the archived snapshots,
+    # newest bucket first
+    data = await asyncio.to_thread(read_columns, base_path, type_id, "snapshots", start - start % seconds, end)
+    if not data:
+        return []
+    keep = ~np.isnan(data["min_sell"])
+    timestamps, prices, volumes = data["timestamp"][keep], data["min_sell"][keep], data["sell_volume"][keep]
+    if not len(timestamps):
+        return []
+    buckets, starts, samples = np.unique(timestamps - timestamps % seconds, return_index=True, return_counts=True)
+    lasts = starts + samples - 1
+    rows = [
+        {"timestamp": bucket, "type_id": type_id, "low": low, "high": high, "close": close, "average": average, "volume": volume}
+        for bucket, low, high, close, average, volume in zip(
+            buckets.tolist(),
+            np.minimum.reduceat(prices, starts).tolist(),
+            np.maximum.reduceat(prices, starts).tolist(),
+            prices[lasts].tolist(),
+            (np.add.reduceat(prices, starts) / samples).tolist(),
+            (np.add.reduceat(volumes, starts) / samples).tolist(),
+        )
+    ]
+    rows.reverse()
+    return rows
+
+async def archived_sell_orders(base_path, type_id, start, end):
+    # Rows shaped like DAYS_QUERY's, newest first
+    data = await asyncio.to_thread(read_columns, base_path, type_id, "orders", start, end)
+    if not data:
+        return []
+    sells = ~data["is_buy_order"]
+    rows = [
+        {"timestamp": timestamp, "price": price, "volume_remain": volume, "is_buy_order": 0}
+        for timestamp, price, volume in zip(data["timestamp"][sells].tolist(), data["price"][sells].tolist(), data["volume_remain"][sells].tolist())
+    ]
+    rows.sort(key=lambda row: (row["timestamp"], row["price"]), reverse=True)
+    return rows
+
+async def main():
+    from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+
+    for base_path in (MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX):
+        if args.month:
+            year, month = (int(part) for part in args.month.split("-"))
+            paths = [await asyncio.to_thread(archive_month, base_path, year * 12 + month - 1)]
+        else:
+            paths = await archive_market(base_path)
+        for path in paths:
+            print(f"{base_path.stem}: wrote {path.name}")
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Archive each finished month of market data to data/archive as compressed per-type columns, for reads past live retention.")
+    parser.add_argument("--month", type=str, help="Re-archive one month (YYYY-MM) instead of every finished month not archived yet")
+    args = parser.parse_args()
+
+    asyncio.run(main())
@@ -1,41 +1,42 @@
 import json
 import numpy as np
 from collections import defaultdict
-import aiosqlite
+from functools import lru_cache
 from modules.utils.logging_setup import get_logger
 from modules.utils.paths import ORE_LIST, REPROCESS_YIELD, REPROCESS_IDS, ICE_PRODUCT_LIST
 from modules.utils.id_mapping import map_id_to_name, map_name_to_id
+from modules.utils.db_pool import get_pool
 
 
 log = get_logger("OreController")
 
-async def load_ore_list(path=ORE_LIST):
+MINERAL_PRICE_QUERY = """
+    SELECT type_id, price
+    FROM mineral_prices
+    WHERE type_id = ?
+"""
+
+# Static data files only change with a deploy, so each one is read once per process
+@lru_cache(maxsize=None)
+def _read_json(path):
     with open(path, "r") as file:
-        log.debug("Loading Ore ID List")
-        content = file.read()
-        ore_list = json.loads(content)
-        return ore_list
+        return json.loads(file.read())
+
+async def load_ore_list(path=ORE_LIST):
+    log.debug("Loading Ore ID List")
+    return _read_json(path)
 
 async def load_ice_product_list(path=ICE_PRODUCT_LIST):
-    with open(path, "r") as file:
-        log.debug(f"Loading Ice Product IDs")
-        content = file.read()
-        ice_product_list = json.loads(content)
-        return ice_product_list
+    log.debug(f"Loading Ice Product IDs")
+    return _read_json(path)
     
 async def load_reprocess_yield(path=REPROCESS_YIELD):
-    with open(path, "r") as file:
-        log.debug("Loading Reprocess Yield")
-        content = file.read()
-        reprocess_yield = json.loads(content)
-        return reprocess_yield
+    log.debug("Loading Reprocess Yield")
+    return _read_json(path)
     
 async def load_reprocess_ids(path=REPROCESS_IDS):
-    with open(path, "r") as file:
-        log.debug("Loading Reprocess Yield")
-        content = file.read()
-        reprocess_ids = json.loads(content)
-        return reprocess_ids
+    log.debug("Loading Reprocess IDs")
+    return _read_json(path)
     
 async def find_reprocess_yield(item_name):
     reprocess_yield = await load_reprocess_yield()
@@ -50,7 +51,7 @@ async def find_reprocess_yield(item_name):
 
     return refined_products
 
-async def calculate_ore_value(type_id, database_path):
+async def calculate_ore_value(type_id, database_path, mineral_prices=None):
     ore_price = 0
     material_price = 0
     ice_list = await load_ice_product_list()
@@ -63,7 +64,9 @@ async def calculate_ore_value(type_id, database_path):
     reprocess_yield = await find_reprocess_yield(item_name)
     log.debug(f"Returned reprocess yield for {type_id} ({item_name}) as {reprocess_yield}")
 
-    mineral_prices = await get_mineral_prices(type_id, database_path)
+    # Callers valuing every ore of a snapshot load the mineral prices once and pass them in
+    if mineral_prices is None:
+        mineral_prices = await get_mineral_prices(type_id, database_path)
     log.debug(f"Got mineral prices")
     
     mineral_price_percentile = {
@@ -79,6 +82,10 @@ async def calculate_ore_value(type_id, database_path):
         log.debug(f"Got material type id for {material} as {material_type_id}")
 
         material_price = mineral_price_percentile.get(material_type_id)
+        if material_price is None:
+            # No orders for this mineral in the snapshot (common outside Jita); a price without
+            # it would be stored as if the mineral were worthless, so the ore is not valued at all
+            raise ValueError(f"No price for {material} ({material_type_id}) when valuing {type_id} ({item_name})")
             
         log.debug(f"Returned price of {material_type_id} ({material}) as {material_price}")
         
@@ -112,18 +119,8 @@ async def get_mineral_prices(type_id, database_path):
     return mineral_prices
 
 async def load_mineral_price(type_id, database_path):
-    async with aiosqlite.connect(database_path) as db:
-        db.row_factory = aiosqlite.Row
+    params = [type_id]
 
-        query = """
-            SELECT type_id, price
-            FROM mineral_prices
-            WHERE type_id = ?    
-        """
-
-        params = [type_id]
-            
-        async with db.execute(query, tuple(params)) as cursor:
-            rows = await cursor.fetchall()
-            log.debug(f"Returning mineral data for type id {type_id}")
-            return rows
\ No newline at end of file
+    rows = await get_pool([database_path]).fetchall("load_mineral_price", MINERAL_PRICE_QUERY, tuple(params))
+    log.debug(f"Returning mineral data for type id {type_id}")
+    return rows
\ No newline at end of file
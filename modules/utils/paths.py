@@ -50,11 +50,15 @@ REPROCESS_IDS = DATA_DIR / "reprocess_item_ids.json"
 ITEM_IDS_VOLUME_FILE = DATA_DIR / "Item_IDs_volume.csv"
 REPACKAGED_VOLUME = DATA_DIR / "repackaged_volumes.json"
 MARKET_DB_FILE_PLEX = DATA_DIR / "plex_market_prices.db"
+RECORDINGS_DIR = DATA_DIR / "esi_recordings"
+ARCHIVE_DIR = DATA_DIR / "archive"
 
 # Files (ESI)
 TOKEN_FILE = ESI_DIR / "token.json"
 AT_MANAGER_FILE = ESI_DIR / "at_manager.py"
 RUNTIME_CACHE_PATH = ESI_DIR / "runtime_cache.txt"
+PAGE_CACHE_DIR = ESI_DIR / "page_cache"
+CHECKPOINT_DIR = ESI_DIR / "checkpoints"
 
 
 
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import re
+import sys
+import time as t
+from pathlib import Path
+import aiosqlite
+
+if __name__ == "__main__":
+    # Dynamically add project root to sys.path
+    project_root = Path(__file__).resolve().parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+from modules.utils.logging_setup import get_logger
+from modules.esi.data_control import (
+    market_orders_clustered, rebuild_rollups, backfill_snapshot_rows,
+    RECENT_DATA_QUERY, DAYS_QUERY, LOWEST_PRICE_PER_DAY_QUERY, MIN_SELL_BY_TIME_QUERY, LATEST_PRICE_QUERY, ROLLUP_QUERIES,
+    ORDER_CHANGES_BY_TYPE_QUERY, SNAPSHOT_TIMES_QUERY,
+)
+from modules.utils.ore_controller import MINERAL_PRICE_QUERY
+
+log = get_logger("SchemaMigrations")
+
+async def drop_clustered_type_index(db):
+    # A clustered market_orders is already stored in (type_id, timestamp) order, so the
+    # index from migration 1 only duplicates the table
+    if await market_orders_clustered(db):
+        await db.execute("DROP INDEX IF EXISTS idx_market_orders_type_timestamp_price")
+
+# === Ordered schema migrations ===
+# (version, description, statements). init_db creates the tables, then every migration
+# newer than the database's schema_version is applied in order. Only ever append to this
+# list: an applied migration is never re-run, so editing one does nothing to existing files.
+# Every statement is written to be harmless if it has already taken effect, since two
+# ingesters can start against the same file at once. A statement can also be an async
+# function of the connection, for changes that depend on what the file holds.
+MIGRATIONS = [
+    (1, "market_orders index by type and time (was modules/utils/index_db.py)", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_market_orders_type_timestamp_price
+        ON market_orders(type_id, timestamp DESC, price ASC)
+        """,
+    ]),
+    (2, "Partial covering index over market_orders sell orders", [
+        # Serves pull_recent_data and query_db_days straight from the index, at roughly
+        # half the size of the full index since buy orders are left out
+        """
+        CREATE INDEX IF NOT EXISTS idx_market_orders_sell_type_timestamp
+        ON market_orders(type_id, timestamp, price, volume_remain)
+        WHERE is_buy_order = 0
+        """,
+    ]),
+    (3, "order_changes index by order and time", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_order_changes_order_timestamp
+        ON order_changes(order_id, timestamp)
+        """,
+    ]),
+    (4, "mineral_prices index by type", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_mineral_prices_type
+        ON mineral_prices(type_id, price)
+        """,
+    ]),
+    (5, "Drop the type and time index from clustered market_orders", [
+        drop_clustered_type_index,
+    ]),
+    (6, "Backfill the hourly and daily price rollups from type_snapshots", [
+        rebuild_rollups,
+    ]),
+    (7, "Backfill type_snapshots (and the rollups) from market_orders stored before it existed", [
+        # Every chart and price lookup reads type_snapshots, so a file must not come out of
+        # init_db with its history only in market_orders
+        backfill_snapshot_rows,
+    ]),
+    (8, "Partial covering index over order_changes sell orders by type and time", [
+        # Serves the changes-only replay of one type's sell orders (ORDER_CHANGES_BY_TYPE_QUERY)
+        """
+        CREATE INDEX IF NOT EXISTS idx_order_changes_sell_type_timestamp
+        ON order_changes(type_id, timestamp, order_id, volume_remain, price, change)
+        WHERE is_buy_order = 0
+        """,
+    ]),
+]
+
+async def get_schema_version(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at INTEGER NOT NULL
+        )
+    """)
+    async with db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version") as cursor:
+        (version,) = await cursor.fetchone()
+    return version
+
+async def run_migrations(db):
+    # Anything the caller left open is committed first, so each migration is its own transaction
+    await db.commit()
+    current = await get_schema_version(db)
+    await db.commit()
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        start = t.perf_counter()
+        # BEGIN IMMEDIATE takes the write lock up front, so a second process starting at
+        # the same time waits here instead of building the same index alongside us...
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            # ...and then finds it already done
+            if await get_schema_version(db) >= version:
+                await db.rollback()
+                current = version
+                continue
+            # Index builds on a multi-GB market_orders can take minutes, so this is logged at info
+            log.info(f"Applying schema migration {version}: {description}")
+            for statement in statements:
+                if callable(statement):
+                    await statement(db)
+                else:
+                    await db.execute(statement)
+            await db.execute(
+                "INSERT OR IGNORE INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, int(t.time()))
+            )
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        log.info(f"Schema migration {version} applied in {t.perf_counter() - start:.1f}s")
+        current = version
+
+    # Refreshing planner statistics for any index that was just built; a no-op otherwise
+    await db.execute("PRAGMA optimize")
+    log.debug(f"Schema is at version {current}")
+    return current
+
+# === Query plan check ===
+# Every read query with representative parameters. A plan step that scans a whole table
+# without an index means a missing or unusable index, which on a market_orders of tens of
+# millions of rows is the difference between milliseconds and a minute.
+READ_QUERIES = {
+    "pull_recent_data": (RECENT_DATA_QUERY, (34,)),
+    "query_db_days": (DAYS_QUERY, (34, 0)),
+    "lowest_price_per_day": (LOWEST_PRICE_PER_DAY_QUERY, (34, 0)),
+    "min_sell_by_time": (MIN_SELL_BY_TIME_QUERY, (34, 0)),
+    "query_recent_price / pull_fitting_price_data": (LATEST_PRICE_QUERY, (34,)),
+    "load_mineral_price": (MINERAL_PRICE_QUERY, (34,)),
+    "replay_order_changes": (ORDER_CHANGES_BY_TYPE_QUERY, (34, 0)),
+    "replay_snapshot_times": (SNAPSHOT_TIMES_QUERY, (0, 0)),
+    **{f"query_rollups ({seconds}s)": (query, (34, 0)) for seconds, query in ROLLUP_QUERIES.items()},
+}
+
+# "SCAN market_orders" (or "SCAN TABLE market_orders" on sqlite before 3.36) with no
+# "USING ... INDEX" after it
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+
+async def explain_query(db, query, params):
+    async with db.execute(f"EXPLAIN QUERY PLAN {query}", params) as cursor:
+        return [row[3] for row in await cursor.fetchall()]
+
+async def check_query_plans(db):
+    # Returns {query name: plan} for every read query that does not go through an index
+    async with db.execute("SELECT name FROM sqlite_master WHERE type = 'table'") as cursor:
+        tables = {row[0] for row in await cursor.fetchall()}
+
+    failures = {}
+    for name, (query, params) in READ_QUERIES.items():
+        plan = await explain_query(db, query, params)
+        full_scans = [step for step in plan if (match := FULL_SCAN.match(step)) and match.group(1) in tables]
+        if full_scans or not any("USING" in step for step in plan):
+            failures[name] = plan
+            log.warning(f"{name} does not use an index: {' | '.join(plan)}")
+        else:
+            log.debug(f"{name}: {' | '.join(plan)}")
+    return failures
+
+async def main():
+    from modules.utils.init_db import init_db
+    from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, MARKET_DB_FILE_PLEX
+    from modules.utils.db_partitions import partition_paths
+
+    db_paths = [args.db_path] if args.db_path else [path for base_path in (MARKET_DB_FILE_JITA, MARKET_DB_FILE_GSF, MARKET_DB_FILE_PLEX) for path in partition_paths(base_path)]
+    failed = False
+    for db_path in db_paths:
+        print(f"Migrating {db_path}...")
+        await init_db(db_path)
+        async with aiosqlite.connect(db_path) as db:
+            print(f"  schema version {await get_schema_version(db)}")
+            for name, (query, params) in READ_QUERIES.items():
+                print(f"  {name}: {' | '.join(await explain_query(db, query, params))}")
+            failed = bool(await check_query_plans(db)) or failed
+    print("Some read queries do not use an index" if failed else "Every read query uses an index")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    # === Parse CLI arguments ===
+    parser = argparse.ArgumentParser(description="Bring market databases up to the current schema version and check every read query's plan.")
+    parser.add_argument("--db_path", type=Path, help="A single market database file (default: every partition of every market)")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main()))
@@ -9,6 +9,7 @@ from modules.utils.paths import MARKET_DB_FILE_GSF, MARKET_DB_FILE_JITA, REPACKA
 from modules.utils.id_mapping import map_name_to_id
 from modules.esi.data_control import pull_fitting_price_data, get_volume
 from modules.esi.image_server import get_image
+from modules.utils.db_pool import query_timings, close_db_pools
 
 log = get_logger("FittingImportCalc-Web")
 
@@ -412,5 +413,11 @@ async def enforce_https():
         url = request.url.replace("http://", "https://", 1)
         return redirect(url, code=301)    
 
+@app.after_serving
+async def close_read_pools():
+    # Count, average and worst time of every read query this process has run
+    log.info(f"Read query timings: {query_timings.summary()}")
+    close_db_pools()
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5002, certfile='server.crt', keyfile='server.key')
\ No newline at end of file